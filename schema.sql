@@ -59,9 +59,18 @@ CREATE TABLE IF NOT EXISTS public.conseil_semaine (
   id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
   date_creation timestamp with time zone DEFAULT now(),
   conseil text,
-  id_utilisateur uuid REFERENCES auth.users(id)
+  id_utilisateur uuid REFERENCES auth.users(id),
+  empreinte text, -- SHA-256 des entrées du prompt (réutilisation du conseil si inchangées)
+  statut text DEFAULT 'termine', -- 'en_cours' pendant une génération streamée
+  id_source bigint -- Conseil recopié (entrées inchangées) ; NULL = généré par GPT-4o
 );
 
+-- Bases existantes : ajout des colonnes d'empreinte, de statut et de source
+ALTER TABLE public.conseil_semaine ADD COLUMN IF NOT EXISTS empreinte text;
+ALTER TABLE public.conseil_semaine ADD COLUMN IF NOT EXISTS statut text DEFAULT 'termine';
+ALTER TABLE public.conseil_semaine ADD COLUMN IF NOT EXISTS id_source bigint;
+CREATE INDEX IF NOT EXISTS conseil_semaine_empreinte_idx ON public.conseil_semaine (id_utilisateur, empreinte, date_creation);
+
 CREATE TABLE IF NOT EXISTS public.conseil_seance (
   id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
   date_creation timestamp with time zone DEFAULT now(),
@@ -78,6 +87,26 @@ CREATE TABLE IF NOT EXISTS public.nutrition (
   metadata jsonb
 );
 
+-- Dimension réduite (EMBEDDING_DIMENSIONS=N côté scripts ; scripts/embedding_recall.py mesure le rappel) :
+--   ALTER TABLE public.nutrition ALTER COLUMN embedding TYPE vector(N) USING NULL;
+--   DROP FUNCTION puis recréer match_nutrition et match_nutrition_multi avec vector(N) à la place de vector(1536) ;
+--   relancer aussitôt ingest_pdf.py : la métadonnée embedding_model change, toutes les fiches sont ré-embeddées.
+
+-- File de jobs de génération (scripts/worker.py --queue supabase)
+CREATE TABLE IF NOT EXISTS public.file_generation (
+  id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+  id_utilisateur uuid NOT NULL REFERENCES auth.users(id),
+  type text NOT NULL DEFAULT 'semaine',
+  statut text NOT NULL DEFAULT 'en_attente', -- en_attente | en_cours | termine | ignore | echec
+  tentatives integer NOT NULL DEFAULT 0,
+  disponible_a timestamp with time zone NOT NULL DEFAULT now(),
+  bail_jusqua timestamp with time zone, -- Réservation d'un worker ; expirée => job réclamable à nouveau
+  erreur text,
+  date_creation timestamp with time zone DEFAULT now(),
+  date_maj timestamp with time zone DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS file_generation_statut_idx ON public.file_generation (statut, disponible_a);
+
 -- 2. ACTIVATION DE LA SÉCURITÉ (RLS)
 
 ALTER TABLE public.profil_utilisateur ENABLE ROW LEVEL SECURITY;
@@ -88,6 +117,7 @@ ALTER TABLE public.conseil_jour ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.conseil_semaine ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.conseil_seance ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.nutrition ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.file_generation ENABLE ROW LEVEL SECURITY; -- Aucune politique : service_role uniquement
 
 -- 3. CRÉATION DES POLITIQUES (POLICIES)
 
@@ -0,0 +1,287 @@
+import io
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+import instrumentation
+import vector_index
+import generate_weekly_strategy as weekly
+import ingest_pdf as ingestion
+from clients import project_root, reset_clients, set_clients
+from embedding_cache import EMBEDDING_DIMENSIONS, EmbeddingCache, NullCache, set_default_cache
+from fake_clients import FakeOpenAI, FakeSupabase, deterministic_embedding
+from user_context import configure_context_pool
+from worker_pool import run_for_users
+
+# Benchmark hors ligne : les scripts tournent contre des doublures de Supabase/OpenAI
+# (fake_clients.py) avec latences configurables. Les résultats sont enregistrés en JSON
+# dans .cache/benchmarks/ pour comparer les commits entre eux.
+
+DEFAULT_OUTPUT_DIR = os.path.join(project_root, ".cache", "benchmarks")
+
+SPORTS = ["course", "vélo", "natation", "trail", "musculation", "football"]
+FREQUENCES = ["2h par semaine", "5h par semaine", "12h haut niveau", "reprise sédentaire"]
+WORDS = ("glucides protéines lipides oméga hydratation récupération compétition séance glycogène "
+         "fer zinc magnésium légumineuses céréales poisson colza fruits légumes effort endurance").split()
+
+# --- DONNÉES SYNTHÉTIQUES ---
+
+def seed_users(db, n_users, rng):
+    """Profils, séances (J-28 à J+6) et compétitions (J à J+10) écrits directement dans la base simulée."""
+    today = datetime.now().date()
+    user_ids = [f"00000000-0000-4000-8000-{i:012d}" for i in range(n_users)]
+    profiles, seances, competitions = [], [], []
+    for i, user_id in enumerate(user_ids):
+        profiles.append({"id": user_id, "prenom": f"Athlète{i}", "frequence_entrainement": rng.choice(FREQUENCES),
+                         "sports": rng.choice(SPORTS), "poids": rng.randint(50, 95)})
+        for _ in range(rng.randint(0, 7) + rng.randint(0, 20)):  # Semaine planifiée + historique de charge
+            day = today + timedelta(days=rng.randint(-28, 6))
+            seances.append({"id": len(seances) + 1, "id_utilisateur": user_id, "date": f"{day.isoformat()}T18:00:00",
+                            "sport": rng.choice(SPORTS), "titre": "Séance", "type": "entraînement",
+                            "durée": rng.choice([30, 45, 60, 90, 120]), "intensité": rng.randint(1, 3),
+                            "description": "Séance générée", "période_journée": "soir",
+                            "date_creation": f"{today.isoformat()}T08:00:00"})
+        if rng.random() < 0.2:
+            day = today + timedelta(days=rng.randint(0, 10))
+            competitions.append({"id": len(competitions) + 1, "id_utilisateur": user_id, "date": f"{day.isoformat()}T09:00:00",
+                                 "sport": rng.choice(SPORTS), "durée": 120, "distance": 21, "intensité": 3})
+    db.tables.update({"profil_utilisateur": profiles, "seance": seances, "competition": competitions, "conseil_semaine": []})
+    return user_ids
+
+def seed_knowledge(db):
+    """Table nutrition remplie avec les blocs manuels (embeddings déterministes)."""
+    rows = []
+    for i, block in enumerate(ingestion.knowledge_chunks):
+        metadata = ingestion.build_metadata(block, ingestion.MANUAL_SOURCE)
+        rows.append({"id": 100000 + i, "content": block["content"],
+                     "embedding": deterministic_embedding(block["content"], EMBEDDING_DIMENSIONS), "metadata": metadata})
+    db.tables["nutrition"] = rows
+
+def synthetic_blocks(n_chunks, rng):
+    return [
+        {
+            "key": f"synthetique:{i}",
+            "content": " ".join(rng.choice(WORDS) for _ in range(60)) + f" (bloc {i})",
+            "sources": [i + 1],
+            "metadata": {"horizon": rng.choice(["jour", "week", "seance"]),
+                         "profil": rng.choice(["tous", "REM", "modere", "haut_niveau"]),
+                         "theme": rng.choice(["glucides", "hydratation", "lipides"])},
+        }
+        for i in range(n_chunks)
+    ]
+
+# --- MESURES ---
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+def _fresh_environment(args, cache_dir):
+    db = FakeSupabase(latency_ms=args.supabase_latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate, seed=args.seed)
+    ai = FakeOpenAI(embedding_latency_ms=args.embedding_latency_ms, chat_latency_ms=args.chat_latency_ms,
+                    ttft_ms=args.ttft_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate, seed=args.seed)
+    reset_clients()
+    set_clients(openai=ai, supabase=db)
+    set_default_cache(EmbeddingCache(os.path.join(cache_dir, "embeddings.sqlite3")) if args.warm_cache else NullCache())
+    vector_index.reset_shared_index()
+    instrumentation.reset()
+    return db, ai
+
+def _calls(db, ai):
+    return dict(sorted({**db.calls.counts, **ai.calls.counts}.items()))
+
+def bench_weekly(args, cache_dir):
+    """Stratégie hebdo pour `args.users` utilisateurs synthétiques via le pool de workers."""
+    rng = random.Random(args.seed)
+    db, ai = _fresh_environment(args, cache_dir)
+    user_ids = seed_users(db, args.users, rng)
+    seed_knowledge(db)
+
+    weekly.RAG_BACKEND = args.rag_backend
+    weekly.NUTRITION_INDEX_PATH = os.path.join(cache_dir, "index_absent")  # Toujours chargé depuis la base simulée
+    weekly.STREAM_COMPLETIONS = args.stream
+    weekly.ADVICE_REUSE_DAYS = 0
+    configure_context_pool(args.concurrency)
+
+    latencies = []
+
+    def task(user_id, contexts):
+        started = time.perf_counter()
+        try:
+            return weekly.generate_weekly_strategy(user_id, context=contexts.get(user_id))
+        finally:
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        contexts = weekly.prefetch_contexts(user_ids) if args.batch_context else {}
+        summary = asyncio.run(run_for_users(user_ids, lambda u: task(u, contexts), concurrency=args.concurrency, max_retries=0))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "users": len(user_ids),
+        "ok": len(summary["ok"]),
+        "errors": len(summary["erreur"]),
+        "first_error": next(iter(summary["erreur"].values()), None),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(len(user_ids) / elapsed, 2),
+        "p50_ms": round(_percentile(latencies, 0.5), 1),
+        "p95_ms": round(_percentile(latencies, 0.95), 1),
+        "calls": _calls(db, ai),
+        "stages": instrumentation.summarize(),
+    }
+
+def bench_ingestion(args, cache_dir):
+    """Ingestion de `args.chunks` blocs synthétiques : run initial, puis re-run après modification d'un bloc."""
+    rng = random.Random(args.seed)
+    db, ai = _fresh_environment(args, cache_dir)
+    db.tables["nutrition"] = []
+    blocks = synthetic_blocks(args.chunks, rng)
+
+    runs = {}
+    for label in ("initial", "incremental"):
+        if label == "incremental":
+            blocks[0] = {**blocks[0], "content": blocks[0]["content"] + " (modifié)"}
+        instrumentation.reset()
+        calls_before = _calls(db, ai)
+        started = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            stats = ingestion.sync_chunks(blocks, source="synthetique")
+        elapsed = time.perf_counter() - started
+        calls_after = _calls(db, ai)
+        stages = instrumentation.summarize()
+        embedding = stages.get("openai.embedding", {})
+        runs[label] = {
+            "chunks": len(blocks),
+            "elapsed_s": round(elapsed, 3),
+            "throughput_per_s": round(len(blocks) / elapsed, 2),
+            "p50_ms": embedding.get("p50_ms", 0.0),
+            "p95_ms": embedding.get("p95_ms", 0.0),
+            "stats": stats,
+            "calls": {k: v - calls_before.get(k, 0) for k, v in calls_after.items() if v != calls_before.get(k, 0)},
+            "stages": stages,
+        }
+    return runs
+
+# --- ENREGISTREMENT ET COMPARAISON ---
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=project_root,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "inconnu"
+
+def save_result(result, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{datetime.now():%Y%m%d-%H%M%S}_{result['commit']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    return path
+
+def previous_result(output_dir, params, exclude):
+    """Dernier résultat enregistré avec les mêmes paramètres."""
+    if not os.path.isdir(output_dir):
+        return None
+    for name in sorted(os.listdir(output_dir), reverse=True):
+        path = os.path.join(output_dir, name)
+        if path == exclude or not name.endswith(".json"):
+            continue
+        with open(path, encoding="utf-8") as f:
+            candidate = json.load(f)
+        if candidate.get("params") == params:
+            return candidate
+    return None
+
+def _metrics(result):
+    metrics = {}
+    if "weekly" in result:
+        weekly_result = result["weekly"]
+        metrics["weekly.ok"] = weekly_result["ok"]
+        metrics["weekly.errors"] = weekly_result["errors"]
+        if weekly_result["ok"]:  # Sans aucun succès, débit et latences ne mesurent que des échecs
+            for key in ("throughput_per_s", "p50_ms", "p95_ms"):
+                metrics[f"weekly.{key}"] = weekly_result[key]
+        metrics["weekly.calls"] = sum(weekly_result["calls"].values())
+    for label, run in result.get("ingestion", {}).items():
+        for key in ("throughput_per_s", "p95_ms"):
+            metrics[f"ingestion.{label}.{key}"] = run[key]
+        metrics[f"ingestion.{label}.calls"] = sum(run["calls"].values())
+    return metrics
+
+def print_report(result, baseline=None):
+    print(f"\n--- BENCHMARK ({result['commit']}) ---")
+    current = _metrics(result)
+    reference = _metrics(baseline) if baseline else {}
+    suffix = f"  vs {baseline['commit']}" if baseline else ""
+    print(f"{'métrique':<40}{'valeur':>12}{suffix}")
+    for name, value in current.items():
+        line = f"{name:<40}{value:>12}"
+        if name in reference and reference[name]:
+            delta = (value - reference[name]) / reference[name] * 100
+            line += f"  ({delta:+.1f} %)"
+        print(line)
+    if "weekly" in result:
+        if result["weekly"]["errors"]:
+            print(f"\n❌ {result['weekly']['errors']}/{result['weekly']['users']} utilisateurs en échec"
+                  + ("" if result["weekly"]["ok"] else " : débit et latences non significatifs, omis"))
+            print(f"   Première erreur : {result['weekly'].get('first_error')}")
+        print("\nAppels (stratégie hebdo) :")
+        for name, count in result["weekly"]["calls"].items():
+            print(f"   {name:<40}{count:>8}")
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark hors ligne des scripts de génération et d'ingestion.")
+    parser.add_argument("--users", type=int, default=200, help="Utilisateurs synthétiques (0 = pas de benchmark hebdo)")
+    parser.add_argument("--chunks", type=int, default=500, help="Blocs synthétiques à ingérer (0 = pas de benchmark ingestion)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--supabase-latency-ms", type=float, default=20.0)
+    parser.add_argument("--embedding-latency-ms", type=float, default=80.0)
+    parser.add_argument("--ttft-ms", type=float, default=300.0, help="Latence avant le premier token GPT-4o")
+    parser.add_argument("--chat-latency-ms", type=float, default=700.0, help="Durée de génération après le premier token")
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilité d'erreur par appel simulé")
+    parser.add_argument("--rag-backend", choices=["rpc", "local"], default="rpc")
+    parser.add_argument("--stream", action="store_true", help="Complétions en streaming")
+    parser.add_argument("--no-batch-context", dest="batch_context", action="store_false",
+                        help="Contexte chargé utilisateur par utilisateur plutôt qu'en lot")
+    parser.add_argument("--warm-cache", action="store_true", help="Cache d'embeddings sur disque (temporaire) au lieu d'aucun cache")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--compare", metavar="FICHIER.json", help="Résultat de référence (défaut : dernier run aux mêmes paramètres)")
+    return parser.parse_args(argv)
+
+def run_benchmark(args):
+    params = {k: v for k, v in vars(args).items() if k not in ("output_dir", "compare")}
+    result = {"commit": git_commit(), "date": datetime.now().isoformat(timespec="seconds"), "params": params}
+    instrumentation.enable()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        if args.users:
+            result["weekly"] = bench_weekly(args, cache_dir)
+        if args.chunks:
+            result["ingestion"] = bench_ingestion(args, cache_dir)
+    return result
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    result = run_benchmark(args)
+    path = save_result(result, args.output_dir)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    else:
+        baseline = previous_result(args.output_dir, result["params"], exclude=path)
+    print_report(result, baseline)
+    print(f"\n💾 Résultat enregistré dans {path}")
+    if args.error_rate == 0 and result.get("weekly", {}).get("errors"):
+        print("❌ Échecs sans erreur injectée (--error-rate 0) : le benchmark n'est pas valide.")
+        exit(1)
@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+from dotenv import load_dotenv
+from instrumentation import current_stage, record_retry
+
+# --- CONFIGURATION ---
+# Load environment variables from .env.local in the project root
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+env_path = os.path.join(project_root, '.env.local')
+
+if os.path.exists(env_path):
+    load_dotenv(env_path, override=True)
+
+class ConfigurationError(RuntimeError):
+    """Configuration absente ou incomplète (.env.local, clés API)."""
+
+def load_config():
+    """Lit les variables de connexion ; lève ConfigurationError si l'une d'elles manque."""
+    if not os.path.exists(env_path) and not os.getenv("OPENAI_API_KEY"):
+        raise ConfigurationError(f"Fichier .env.local non trouvé à : {env_path}")
+    config = {
+        "SUPABASE_URL": os.getenv("SUPABASE_URL") or os.getenv("VITE_SUPABASE_URL"),
+        "SUPABASE_SERVICE_KEY": os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("VITE_SUPABASE_SERVICE_KEY"),
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY"),
+    }
+    if not all(config.values()):
+        raise ConfigurationError("Erreur : Variables d'environnement manquantes.")
+    return config
+
+# --- CLIENTS (construits au premier usage) ---
+
+# Pool de connexions HTTP keep-alive : un processus long (worker.py) réutilise les
+# connexions TLS ouvertes au lieu d'en négocier une par requête
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "32"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "120"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "120"))
+
+RETRY_HEADER = "x-stainless-retry-count"  # Posé par le SDK OpenAI sur chaque tentative (0 = premier envoi)
+
+_clients = {}
+_lock = threading.Lock()
+
+def _count_sdk_retry(request):
+    """Hook httpx : compte les nouvelles tentatives faites par le SDK lui-même (429, 5xx, timeouts),
+    rattachées à l'étape en cours (le hook s'exécute dans le thread appelant)."""
+    if request.headers.get(RETRY_HEADER, "0") != "0":
+        record_retry(current_stage() or "http")
+
+def _http_client():
+    import httpx  # Dépendance d'openai et de supabase
+    limits = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                          keepalive_expiry=HTTP_KEEPALIVE_SECONDS)
+    return httpx.Client(limits=limits, timeout=HTTP_TIMEOUT_SECONDS, event_hooks={"request": [_count_sdk_retry]})
+
+def get_openai():
+    """Client OpenAI partagé du processus."""
+    with _lock:
+        if "openai" not in _clients:
+            from openai import OpenAI  # Import lourd : différé jusqu'au premier appel
+            _clients["openai"] = OpenAI(api_key=load_config()["OPENAI_API_KEY"], http_client=_http_client())
+        return _clients["openai"]
+
+def get_supabase():
+    """Client Supabase (service role) partagé du processus."""
+    with _lock:
+        if "supabase" not in _clients:
+            from supabase import ClientOptions, create_client
+            config = load_config()
+            options = ClientOptions(httpx_client=_http_client(), postgrest_client_timeout=HTTP_TIMEOUT_SECONDS)
+            _clients["supabase"] = create_client(config["SUPABASE_URL"], config["SUPABASE_SERVICE_KEY"], options=options)
+        return _clients["supabase"]
+
+def warm_up():
+    """Construit les deux clients et ouvre leurs connexions (une requête légère chacun).
+
+    Un échec est signalé sans être fatal : la connexion sera retentée au premier vrai appel.
+    """
+    timings = {}
+    for name, ping in (
+        ("supabase", lambda: get_supabase().table("profil_utilisateur").select("id").limit(1).execute()),
+        ("openai", lambda: get_openai().models.retrieve("gpt-4o")),
+    ):
+        started = time.perf_counter()
+        try:
+            ping()
+            timings[name] = time.perf_counter() - started
+        except Exception as e:
+            print(f"⚠️ Préchauffage {name} impossible : {e}")
+    return timings
+
+def set_clients(openai=None, supabase=None):
+    """Injecte des clients déjà construits (benchmarks, doublures locales)."""
+    with _lock:
+        if openai is not None:
+            _clients["openai"] = openai
+        if supabase is not None:
+            _clients["supabase"] = supabase
+
+def reset_clients():
+    with _lock:
+        _clients.clear()
@@ -0,0 +1,153 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+from array import array
+
+# --- CONFIGURATION ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+
+DEFAULT_CACHE_PATH = os.path.join(project_root, ".cache", "embeddings.sqlite3")
+DEFAULT_MAX_MB = 256
+
+# Dimension des embeddings (paramètre `dimensions` de text-embedding-3) ; doit correspondre à
+# la colonne nutrition.embedding vector(N) et aux fonctions match_nutrition (voir schema.sql)
+NATIVE_DIMENSIONS = 1536
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", str(NATIVE_DIMENSIONS)))
+
+def embedding_model_id(model, dimensions=EMBEDDING_DIMENSIONS):
+    """Identifiant du couple (modèle, dimension) pour les clés de cache et la métadonnée `embedding_model`.
+
+    En dimension native, c'est le nom du modèle seul (compatibilité avec l'existant).
+    """
+    return model if dimensions == NATIVE_DIMENSIONS else f"{model}@{dimensions}"
+
+class EmbeddingCache:
+    """Cache disque des embeddings, indexé par (modèle, hash du texte).
+
+    Les vecteurs sont stockés en float32 binaire (4 octets par dimension) dans
+    SQLite. Au-delà de `max_bytes`, les entrées les moins récemment lues sont
+    évincées (LRU).
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "api_calls": 0}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings (last_access)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(model, text):
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model, texts):
+        """Retourne la liste des vecteurs en cache (None pour les absents)."""
+        keys = [self.make_key(model, t) for t in texts]
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                for key, blob in self._db.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part):
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._db.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?", [(now, k) for k in found])
+                self._db.commit()
+            self.stats["hits"] += sum(1 for k in keys if k in found)
+            self.stats["misses"] += sum(1 for k in keys if k not in found)
+        return [found.get(k) for k in keys]
+
+    def put_many(self, model, texts, vectors):
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            blob = array("f", vector).tobytes()
+            rows.append((self.make_key(model, text), model, blob, len(blob), now))
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        evicted = []
+        for key, size in self._db.execute("SELECT key, size FROM embeddings ORDER BY last_access"):
+            if total - freed <= self.max_bytes:
+                break
+            evicted.append((key,))
+            freed += size
+        self._db.executemany("DELETE FROM embeddings WHERE key = ?", evicted)
+        self.stats["evictions"] += len(evicted)
+
+    def embed(self, texts, model, embed_fn):
+        """Retourne les vecteurs de `texts`, en appelant `embed_fn(textes_manquants)` une seule fois pour les absents."""
+        vectors = self.get_many(model, texts)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if missing:
+            self.stats["api_calls"] += 1
+            computed = embed_fn(missing)
+            self.put_many(model, missing, computed)
+            by_text = dict(zip(missing, computed))
+            vectors = [v if v is not None else by_text[t] for t, v in zip(texts, vectors)]
+        return vectors
+
+    def summary(self):
+        return (f"🗄️  Cache embeddings : {self.stats['hits']} hits, {self.stats['misses']} misses, "
+                f"{self.stats['evictions']} évictions, {self.stats['api_calls']} appels API")
+
+class NullCache(EmbeddingCache):
+    """Cache désactivé (EMBEDDING_CACHE=0) : chaque demande part vers l'API."""
+
+    def __init__(self):
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "api_calls": 0}
+        self._lock = threading.Lock()
+
+    def get_many(self, model, texts):
+        self.stats["misses"] += len(texts)
+        return [None] * len(texts)
+
+    def put_many(self, model, texts, vectors):
+        pass
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+def get_default_cache():
+    """Cache partagé du processus, configuré par EMBEDDING_CACHE_PATH / EMBEDDING_CACHE_MAX_MB / EMBEDDING_CACHE."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            if os.getenv("EMBEDDING_CACHE", "1") == "0":
+                _default_cache = NullCache()
+            else:
+                _default_cache = EmbeddingCache(
+                    path=os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH),
+                    max_bytes=int(float(os.getenv("EMBEDDING_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024),
+                )
+        return _default_cache
+
+def set_default_cache(cache):
+    """Remplace le cache partagé du processus (benchmarks : cache vide ou temporaire)."""
+    global _default_cache
+    with _default_lock:
+        _default_cache = cache
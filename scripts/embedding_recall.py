@@ -0,0 +1,144 @@
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from embedding_cache import NATIVE_DIMENSIONS
+from vector_index import PRECISIONS, NutritionIndex
+
+# Rappel et latence de l'index réduit / quantifié par rapport à la référence pleine précision
+# (1536 dimensions, float32). Les dimensions réduites sont obtenues localement en tronquant puis
+# renormalisant les vecteurs complets : pour text-embedding-3, c'est équivalent au paramètre
+# `dimensions` de l'API (embeddings « Matryoshka »), donc aucun ré-embedding n'est nécessaire.
+
+DEFAULT_DIMENSIONS = (1536, 1024, 512, 256)
+TOP_K = 8
+
+def truncate_embeddings(matrix, dimensions):
+    """Garde les `dimensions` premières composantes et renormalise chaque ligne."""
+    matrix = np.asarray(matrix, dtype=np.float32)[:, :dimensions]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+# --- JEUX DE DONNÉES ---
+
+def synthetic_corpus(n_rows, dimensions=NATIVE_DIMENSIONS, seed=0):
+    """Vecteurs aléatoires dont la variance décroît avec l'indice de composante, pour imiter
+    la concentration de l'information dans les premières dimensions des embeddings Matryoshka.
+    """
+    rng = np.random.default_rng(seed)
+    decay = 1 / np.sqrt(1 + np.arange(dimensions) / 64)
+    matrix = rng.standard_normal((n_rows, dimensions)).astype(np.float32) * decay
+    metadatas = [{"profil": ["tous", "REM", "modere", "haut_niveau"][i % 4], "horizon": ["week", "jour", "seance"][i % 3]}
+                 for i in range(n_rows)]
+    return NutritionIndex(np.arange(1, n_rows + 1), [f"bloc {i}" for i in range(n_rows)], metadatas, matrix)
+
+def knowledge_corpus():
+    """Les blocs `knowledge_chunks` d'ingest_pdf.py et les requêtes RAG réelles, embeddés en pleine dimension (cache)."""
+    import ingest_pdf
+    from rag_retrieval import BASE_QUERY, THEMED_QUERIES
+    if ingest_pdf.EMBEDDING_MODEL_ID != ingest_pdf.EMBEDDING_MODEL:
+        raise SystemExit("❌ La référence doit être en pleine dimension : lancer sans EMBEDDING_DIMENSIONS.")
+    blocks = ingest_pdf.knowledge_chunks
+    texts = [BASE_QUERY] + [text for text, _ in THEMED_QUERIES.values()]
+    vectors = ingest_pdf.generate_embeddings([b["content"] for b in blocks] + texts)
+    index = NutritionIndex(np.arange(1, len(blocks) + 1), [b["content"] for b in blocks],
+                           [b["metadata"] for b in blocks], vectors[:len(blocks)])
+    return index, np.asarray(vectors[len(blocks):], dtype=np.float32)
+
+def synthetic_queries(index, n_queries, noise=0.5, seed=1):
+    """Lignes de l'index bruitées (bruit relatif à la norme de la ligne)."""
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(index), size=n_queries, replace=n_queries > len(index))
+    base = index.dequantize(picks)
+    return base + rng.standard_normal(base.shape).astype(np.float32) * noise / np.sqrt(base.shape[1])
+
+# --- MESURE ---
+
+def _top_ids(index, queries, profils, top_k):
+    """Top-k de chaque requête (filtre profil tournant, seuil désactivé) et durée moyenne par requête."""
+    results = []
+    started = time.perf_counter()
+    for i, query in enumerate(queries):
+        matches = index.match(query, match_threshold=-1.0, match_count=top_k, filter_profil=profils[i % len(profils)])
+        results.append([m["id"] for m in matches])
+    return results, (time.perf_counter() - started) / max(1, len(queries)) * 1000
+
+def evaluate(index, queries, dimensions=DEFAULT_DIMENSIONS, precisions=PRECISIONS, top_k=TOP_K):
+    """Rappel@k de chaque (dimension, précision) par rapport à (dimension maximale, float32)."""
+    profils = sorted(index._profil_masks) or [None]
+    precisions = ["float32"] + [p for p in precisions if p != "float32"]  # La référence est la première ligne
+    full = index.dequantize(np.arange(len(index)))
+    reference = None
+    rows = []
+    for dims in sorted(dimensions, reverse=True):
+        reduced = NutritionIndex(index.ids, index.contents, index.metadatas, truncate_embeddings(full, dims), normalized=True)
+        reduced_queries = truncate_embeddings(queries, dims)
+        payload = len(json.dumps([round(float(x), 8) for x in reduced_queries[0]]))  # Requête JSON envoyée à l'RPC
+        for precision in precisions:
+            candidate = reduced.quantized(precision)
+            ids, latency = _top_ids(candidate, reduced_queries, profils, top_k)
+            if reference is None:
+                reference = ids
+            recall = np.mean([len(set(a) & set(b)) / len(b) if b else 1.0 for a, b in zip(ids, reference)])
+            rows.append({
+                "dimensions": dims,
+                "precision": precision,
+                f"rappel@{top_k}": round(float(recall), 4),
+                "ms_par_requete": round(latency, 3),
+                "index_mo": round(candidate.nbytes() / 1e6, 3),
+                "requete_json_ko": round(payload / 1e3, 1),
+            })
+    return rows
+
+def print_rows(rows, top_k=TOP_K):
+    header = f"{'dim':>6}{'précision':>11}{f'rappel@{top_k}':>11}{'ms/req':>10}{'index Mo':>10}{'JSON ko':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(f"{r['dimensions']:>6}{r['precision']:>11}{r[f'rappel@{top_k}']:>11.3f}{r['ms_par_requete']:>10.3f}"
+              f"{r['index_mo']:>10.2f}{r['requete_json_ko']:>9.1f}")
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Rappel/latence des embeddings réduits et quantifiés.")
+    parser.add_argument("--source", choices=["knowledge", "supabase", "synthetic"], default="synthetic",
+                        help="knowledge : knowledge_chunks (API OpenAI, via cache) ; supabase : table nutrition ; synthetic : hors ligne")
+    parser.add_argument("--rows", type=int, default=10000, help="Lignes du corpus synthétique")
+    parser.add_argument("--queries", type=int, default=200, help="Requêtes synthétiques (lignes bruitées)")
+    parser.add_argument("--dimensions", default=",".join(str(d) for d in DEFAULT_DIMENSIONS))
+    parser.add_argument("--precisions", default=",".join(PRECISIONS))
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--out", metavar="FICHIER.json", help="Écrit les résultats en JSON")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    dimensions = [int(d) for d in args.dimensions.split(",")]
+    precisions = args.precisions.split(",")
+    real_queries = np.zeros((0, NATIVE_DIMENSIONS), dtype=np.float32)
+
+    if args.source == "synthetic":
+        index = synthetic_corpus(args.rows)
+    else:
+        from clients import ConfigurationError, get_supabase, load_config
+        try:
+            load_config()
+        except ConfigurationError as e:
+            print(f"❌ {e}")
+            exit(1)
+        if args.source == "knowledge":
+            index, real_queries = knowledge_corpus()
+        else:
+            index = NutritionIndex.from_supabase(get_supabase())
+    if index.dimensions < max(dimensions):
+        print(f"❌ Le corpus n'a que {index.dimensions} dimensions : la référence doit être en pleine dimension.")
+        exit(1)
+
+    queries = np.vstack([real_queries, synthetic_queries(index, args.queries)])
+    print(f"--- RAPPEL / LATENCE ({args.source} : {len(index)} lignes, {len(queries)} requêtes) ---")
+    rows = evaluate(index, queries, dimensions, precisions, args.top_k)
+    print_rows(rows, args.top_k)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        print(f"💾 Résultats écrits dans {args.out}")
@@ -0,0 +1,284 @@
+import time
+import random
+import hashlib
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import numpy as np
+from vector_index import NutritionIndex
+
+# Doublures locales de Supabase et OpenAI pour les benchmarks : même surface d'API que
+# les clients réels utilisés par les scripts, latence et taux d'erreur configurables,
+# embeddings déterministes (même texte => même vecteur).
+
+class FakeServiceError(RuntimeError):
+    """Erreur injectée par une doublure (taux d'erreur configuré)."""
+
+class _Faults:
+    """Latence (ms, avec gigue) et taux d'erreur d'un service simulé ; tirages reproductibles."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def apply(self, operation):
+        with self._lock:
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms))
+            fail = self._rng.random() < self.error_rate
+        if delay:
+            time.sleep(delay / 1000)
+        if fail:
+            raise FakeServiceError(f"Erreur simulée sur {operation}")
+
+class CallCounter:
+    def __init__(self):
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def add(self, key):
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+# --- SUPABASE ---
+
+def _timestamp(value):
+    """Valeur ISO -> datetime UTC naïf ; None si ce n'est pas une date."""
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _comparable(a, b):
+    """Comparaison à la Postgres : deux dates/horodatages sont comparés comme timestamps
+    ('AAAA-MM-JJ' = minuit, donc `lte('date', jour)` exclut une séance à 18:00 ce jour-là),
+    les nombres comme nombres, le reste comme texte."""
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return a, b
+    ta, tb = _timestamp(a), _timestamp(b)
+    if ta is not None and tb is not None:
+        return ta, tb
+    return str(a), str(b)
+
+class _Query:
+    """Sous-ensemble du query builder postgrest-py utilisé par les scripts."""
+
+    def __init__(self, db, table):
+        self.db, self.table = db, table
+        self.op, self.payload, self.columns = "select", None, "*"
+        self.filters, self.order_by, self.bounds, self.max_rows, self.one = [], None, None, None, False
+
+    def select(self, columns="*", **kwargs):
+        self.columns = columns
+        return self
+
+    def _filter(self, column, predicate):
+        self.filters.append(lambda row: predicate(row.get(column)))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, lambda v: v == value)
+
+    def neq(self, column, value):
+        return self._filter(column, lambda v: v is not None and v != value)
+
+    def _compare(self, column, value, predicate):
+        return self._filter(column, lambda v: v is not None and predicate(*_comparable(v, value)))
+
+    def gte(self, column, value):
+        return self._compare(column, value, lambda a, b: a >= b)
+
+    def lte(self, column, value):
+        return self._compare(column, value, lambda a, b: a <= b)
+
+    def lt(self, column, value):
+        return self._compare(column, value, lambda a, b: a < b)
+
+    def is_(self, column, value):
+        return self._filter(column, lambda v: v is None if value in ("null", None) else str(v).lower() == str(value).lower())
+
+    def in_(self, column, values):
+        values = set(values)
+        return self._filter(column, lambda v: v in values)
+
+    def order(self, column, desc=False):
+        self.order_by = (column, desc)
+        return self
+
+    def limit(self, count):
+        self.max_rows = count
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end)
+        return self
+
+    def single(self):
+        self.one = True
+        return self
+
+    def insert(self, payload):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict="id", **kwargs):
+        self.op, self.payload = "upsert", payload
+        return self
+
+    def update(self, payload):
+        self.op, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def execute(self):
+        self.db.faults.apply(f"{self.table}.{self.op}")
+        self.db.calls.add(f"supabase.{self.table}.{self.op}")
+        return SimpleNamespace(data=self.db._run(self))
+
+class FakeSupabase:
+    """Base en mémoire ; les RPC `match_nutrition(_multi)` appliquent la même sémantique que les fonctions SQL."""
+
+    # Tables dont l'id est GENERATED ALWAYS AS IDENTITY (schema.sql) : un id explicite est refusé
+    IDENTITY_TABLES = {"seance", "competition", "conseil_jour", "conseil_semaine", "conseil_seance", "nutrition", "file_generation"}
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, seed=0):
+        self.tables = {}
+        self.calls = CallCounter()
+        self.faults = _Faults(latency_ms, jitter_ms, error_rate, seed)
+        self._lock = threading.RLock()
+        self._next_id = 1
+        self._index = None
+
+    def table(self, name):
+        return _Query(self, name)
+
+    def rpc(self, name, params):
+        def execute():
+            self.faults.apply(f"rpc.{name}")
+            self.calls.add(f"supabase.rpc.{name}")
+            return SimpleNamespace(data=self._rpc(name, params))
+        return SimpleNamespace(execute=execute)
+
+    def _rpc(self, name, params):
+        if name not in ("match_nutrition", "match_nutrition_multi"):
+            raise FakeServiceError(f"Fonction RPC inconnue : {name}")
+        with self._lock:
+            if self._index is None:
+                self._index = NutritionIndex.from_rows(self.tables.get("nutrition", []))
+            index = self._index
+        if name == "match_nutrition_multi":
+            return index.match_many(**params)
+        return index.match(**params)
+
+    def _run(self, query):
+        with self._lock:
+            rows = self.tables.setdefault(query.table, [])
+            if query.table == "nutrition" and query.op != "select":
+                self._index = None
+            if query.op in ("insert", "upsert"):
+                payload = query.payload if isinstance(query.payload, list) else [query.payload]
+                written = []
+                for item in payload:
+                    if query.table in self.IDENTITY_TABLES and "id" in item:
+                        raise FakeServiceError(f'cannot insert a non-DEFAULT value into column "id" of {query.table} (428C9)')
+                    existing = next((r for r in rows if "id" in item and r.get("id") == item["id"]), None)
+                    if existing is not None and query.op == "upsert":
+                        existing.update(item)
+                        written.append(dict(existing))
+                        continue
+                    row = {"id": self._next_id, "date_creation": time.strftime("%Y-%m-%dT%H:%M:%S"), **item}
+                    self._next_id += 1
+                    rows.append(row)
+                    written.append(dict(row))
+                return written
+            selected = [r for r in rows if all(f(r) for f in query.filters)]
+            if query.op == "update":
+                for row in selected:
+                    row.update(query.payload)
+                return [dict(r) for r in selected]
+            if query.op == "delete":
+                ids = {id(r) for r in selected}
+                self.tables[query.table] = [r for r in rows if id(r) not in ids]
+                return [dict(r) for r in selected]
+            if query.order_by:
+                column, desc = query.order_by
+                selected.sort(key=lambda r: str(r.get(column)), reverse=desc)
+            if query.bounds:
+                selected = selected[query.bounds[0]:query.bounds[1] + 1]
+            if query.max_rows is not None:
+                selected = selected[:query.max_rows]
+            if query.columns != "*":
+                columns = [c.strip() for c in query.columns.split(",")]
+                selected = [{c: r.get(c) for c in columns} for r in selected]
+            else:
+                selected = [dict(r) for r in selected]
+        if query.one:
+            if len(selected) != 1:
+                raise FakeServiceError("JSON object requested, multiple (or no) rows returned")
+            return selected[0]
+        return selected
+
+# --- OPENAI ---
+
+def deterministic_embedding(text, dimensions=1536):
+    """Vecteur unitaire pseudo-aléatoire dérivé du hash du texte."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+class FakeOpenAI:
+    """Embeddings déterministes et complétions factices (bloquantes ou streamées)."""
+
+    def __init__(self, embedding_latency_ms=0.0, chat_latency_ms=0.0, ttft_ms=0.0, jitter_ms=0.0,
+                 error_rate=0.0, completion_tokens=400, seed=0):
+        self.calls = CallCounter()
+        self.embedding_faults = _Faults(embedding_latency_ms, jitter_ms, error_rate, seed)
+        self.chat_faults = _Faults(ttft_ms, jitter_ms, error_rate, seed + 1)
+        self.chat_latency_ms = chat_latency_ms
+        self.completion_tokens = completion_tokens
+        self.embeddings = SimpleNamespace(create=self._create_embeddings)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_completion))
+        self.models = SimpleNamespace(retrieve=self._retrieve_model)
+
+    def _retrieve_model(self, model, **kwargs):
+        self.embedding_faults.apply("models")
+        self.calls.add("openai.models")
+        return SimpleNamespace(id=model)
+
+    def _create_embeddings(self, input, model, dimensions=None, **kwargs):
+        texts = input if isinstance(input, list) else [input]
+        self.embedding_faults.apply("embeddings")
+        self.calls.add("openai.embeddings")
+        data = [SimpleNamespace(index=i, embedding=deterministic_embedding(t, dimensions or 1536)) for i, t in enumerate(texts)]
+        tokens = sum(len(t.split()) for t in texts)
+        return SimpleNamespace(data=data, usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens))
+
+    def _create_completion(self, model, messages, stream=False, **kwargs):
+        self.chat_faults.apply("chat")  # Latence jusqu'au premier token
+        self.calls.add("openai.chat.stream" if stream else "openai.chat")
+        prompt_tokens = sum(len(m["content"].split()) for m in messages)
+        words = [f"mot{i} " for i in range(self.completion_tokens)]
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(words), total_tokens=prompt_tokens + len(words))
+        per_token = self.chat_latency_ms / 1000 / max(1, len(words))
+        if not stream:
+            time.sleep(self.chat_latency_ms / 1000)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="".join(words)))], usage=usage)
+
+        def chunks():
+            for word in words:
+                if per_token:
+                    time.sleep(per_token)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word))], usage=None)
+            yield SimpleNamespace(choices=[], usage=usage)
+        return chunks()
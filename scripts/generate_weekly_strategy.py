@@ -1,193 +1,461 @@
 import os
-import json
 import sys
+import json
+import hashlib
+import time
+import threading
+import statistics
+import asyncio
+import argparse
 from datetime import datetime, timedelta
-from openai import OpenAI
-from supabase import create_client
-from dotenv import load_dotenv
+from clients import ConfigurationError, get_openai, get_supabase, load_config, project_root
+from embedding_cache import EMBEDDING_DIMENSIONS, embedding_model_id, get_default_cache
+from instrumentation import add_profile_arguments, finish_profiling, record_usage, span, start_profiling, user_scope
+from vector_index import DEFAULT_SNAPSHOT_PATH, PRECISIONS, get_shared_index
+from rag_retrieval import build_rag_queries, rank_rag_results
+from prompt_builder import COMPETITION_COLUMNS, PROMPT_TOKEN_BUDGET, SESSION_COLUMNS, build_weekly_prompt
+from training_load import ACWR_HIGH, HIGH_VOLUME_MINUTES, metrics_from_rows
+from user_context import configure_context_pool, load_user_context, load_users_context
+from worker_pool import configure_rate_limits, load_checkpoint, print_summary, run_for_users, throttle
 
 # --- CONFIGURATION ---
-# Load environment variables from .env.local in the project root
-current_dir = os.path.dirname(os.path.abspath(__file__))
-project_root = os.path.dirname(current_dir)
-env_path = os.path.join(project_root, '.env.local')
-
-if os.path.exists(env_path):
-    load_dotenv(env_path, override=True)
-else:
-    print(f"❌ Fichier .env.local non trouvé à : {env_path}")
-    exit(1)
-
-SUPABASE_URL = os.getenv("SUPABASE_URL") or os.getenv("VITE_SUPABASE_URL")
-SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("VITE_SUPABASE_SERVICE_KEY")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-if not OPENAI_API_KEY or not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
-    print("❌ Erreur : Variables d'environnement manquantes.")
-    exit(1)
-
-client_ai = OpenAI(api_key=OPENAI_API_KEY)
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-
-def get_weekly_data(user_id):
-    """Récupère tout le contexte utilisateur pour les 7 prochains jours."""
-    # 1. Profil
-    try:
-        profile_response = supabase.table("profil_utilisateur").select("*").eq("id", user_id).single().execute()
-        profile = profile_response.data
-    except Exception as e:
-        print(f"Erreur récupération profil: {e}")
-        return None, None, None
-    
-    # 2. Séances de J à J+6
-    today = datetime.now().date()
-    end_week = today + timedelta(days=6)
-    
-    try:
-        seances = supabase.table("seance").select("*").eq("id_utilisateur", user_id).gte("date", today.isoformat()).lte("date", end_week.isoformat()).execute().data
-    except Exception as e:
-        print(f"Erreur récupération séances: {e}")
-        seances = []
-    
-    # 3. Compétition (J à J+10 pour anticipation)
-    end_horizon = today + timedelta(days=10)
-    try:
-        competitions = supabase.table("competition").select("*").eq("id_utilisateur", user_id).gte("date", today.isoformat()).lte("date", end_horizon.isoformat()).execute().data
-    except Exception as e:
-        print(f"Erreur récupération compétitions: {e}")
-        competitions = []
-    
-    return profile, seances, competitions
+# Les clients OpenAI/Supabase sont construits au premier usage (voir clients.py)
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_MODEL_ID = embedding_model_id(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)
+
+# "rpc" : match_nutrition_multi côté Supabase ; "local" : index NumPy partagé (voir vector_index.py)
+RAG_BACKEND = os.getenv("RAG_BACKEND", "rpc")
+NUTRITION_INDEX_PATH = os.getenv("NUTRITION_INDEX_PATH", DEFAULT_SNAPSHOT_PATH)
+RAG_INDEX_PRECISION = os.getenv("RAG_INDEX_PRECISION", "float32")  # Mémoire de l'index local : float32, float16 ou int8 (voir NutritionIndex.quantized)
+
+# Réutilisation d'un conseil récent si les entrées du prompt sont identiques (0 = désactivé)
+ADVICE_REUSE_DAYS = int(os.getenv("ADVICE_REUSE_DAYS", "0"))
+PROMPT_VERSION = 3  # À incrémenter à chaque modification du prompt : invalide les empreintes existantes
 
-def determine_profile_tag(profile):
-    """Détermine le profil selon le document source."""
+# Streaming de la complétion : le conseil est enregistré au fil de l'eau (statut 'en_cours')
+STREAM_COMPLETIONS = os.getenv("STREAM_COMPLETIONS", "0") == "1"
+STREAM_PERSIST_SECONDS = 2.0  # Intervalle minimal entre deux sauvegardes du texte partiel
+STREAM_PERSIST_MAX_SECONDS = 60.0  # Plafond de l'intervalle, doublé à chaque sauvegarde en échec
+LLM_TIMINGS = []  # (user_id, temps jusqu'au premier token, durée totale) en secondes
+PROMPT_REPORTS = []  # Rapports de tokens de build_weekly_prompt, un par prompt envoyé
+_timings_lock = threading.Lock()
+
+def determine_profile_tag(profile, load=None):
+    """Détermine le profil selon le document source.
+
+    `load` : indicateurs de training_load ; le volume planifié mesuré prime sur le volume déclaré.
+    """
     if not profile:
         return "tous"
         
     # Volume hebdo > 10h ou mention 'Haut Niveau'
     vol = str(profile.get("frequence_entrainement", "")).lower()
+    if load and load["volume_semaine_min"] >= HIGH_VOLUME_MINUTES:
+        return "haut_niveau"
     if "10h" in vol or "haut niveau" in vol:
         return "haut_niveau"
     if "sédentaire" in vol or "reprise" in vol or "rem" in vol:
         return "REM"
     return "modere"
 
-def retrieve_rag_context(query, profile_tag):
-    """Recherche les connaissances dans la table nutrition."""
-    embedding = client_ai.embeddings.create(
-        input=query,
-        model="text-embedding-3-small"
-    ).data[0].embedding
+def compute_user_load(user_id, context):
+    """Indicateurs de charge d'un utilisateur à partir des séances J-28 à J+6 de son contexte
+    (aucune requête) ; None si le calcul échoue : le prompt s'en passe."""
+    try:
+        with span("charge"):
+            seances = context["historique"] + context["seances"]
+            return metrics_from_rows(seances, context["competitions"], [user_id]).for_user(user_id)
+    except Exception as e:
+        print(f"Erreur calcul de la charge d'entraînement: {e}")
+        return None
+
+def prefetch_contexts(user_ids):
+    """Contextes de plusieurs utilisateurs + indicateurs de charge calculés en une passe pour tout le lot.
+
+    Les indicateurs sont calculés sur les séances déjà chargées avec les contextes, sans relire
+    les tables. Ne lève pas : un utilisateur absent du résultat (paquet en échec) charge son
+    contexte lui-même, et sans indicateurs de lot chacun calcule sa charge.
+    """
+    with span("supabase.contexte_lot"):
+        contexts = load_users_context(get_supabase(), user_ids)
+    try:
+        with span("charge.lot"):
+            seances = [s for c in contexts.values() for s in c["historique"] + c["seances"]]
+            competitions = [comp for c in contexts.values() for comp in c["competitions"]]
+            metrics = metrics_from_rows(seances, competitions, list(contexts))
+    except Exception as e:
+        print(f"⚠️ Charge d'entraînement non précalculée ({e}) : calcul utilisateur par utilisateur.")
+        return contexts
+    for user_id, context in contexts.items():
+        context["charge"] = metrics.for_user(user_id)
+    return contexts
+
+def embed_texts(texts):
+    """Appel direct à l'API embeddings (utilisé pour les absents du cache)."""
+    throttle("openai")
+    with span("openai.embedding", textes=len(texts)):
+        response = get_openai().embeddings.create(
+            input=texts,
+            model=EMBEDDING_MODEL,
+            dimensions=EMBEDDING_DIMENSIONS
+        )
+        record_usage(response.usage)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+def retrieve_rag_context(queries, profile_tag, match_count=8):
+    """Recherche les connaissances dans la table nutrition pour toutes les requêtes de `build_rag_queries`.
 
-    # Utilisation de la fonction RPC match_nutrition
+    Un seul appel embeddings (via le cache) et une seule recherche (RPC match_nutrition_multi ou
+    index local), puis fusion MMR : liste de {id, content, similarity, metadata, theme}.
+    """
+    embeddings = get_default_cache().embed([q["texte"] for q in queries], EMBEDDING_MODEL_ID, embed_texts)
+
+    # Paramètres de la fonction RPC match_nutrition_multi (même contrat pour l'index local)
     rpc_params = {
-        "query_embedding": embedding,
+        "queries": [{"embedding": e, "horizon": q["horizon"]} for q, e in zip(queries, embeddings)],
         "match_threshold": 0.4,
-        "match_count": 8,
+        "match_count": match_count,
         "filter_profil": profile_tag,
-        "filter_horizon": "week"
+        "include_redundancy": True
     }
     
     try:
-        results = supabase.rpc("match_nutrition", rpc_params).execute()
-        return "\n".join([f"- {r['content']}" for r in results.data])
+        if RAG_BACKEND == "local":
+            with span("rag.index_local", requetes=len(queries)):
+                rows = get_shared_index(get_supabase(), NUTRITION_INDEX_PATH, RAG_INDEX_PRECISION).match_many(**rpc_params)
+        else:
+            throttle("supabase")
+            with span("rag.match_nutrition_multi", requetes=len(queries)):
+                rows = get_supabase().rpc("match_nutrition_multi", rpc_params).execute().data
+        return rank_rag_results(rows, queries, match_count)
     except Exception as e:
-        print(f"Erreur RPC match_nutrition: {e}")
-        return ""
+        source = "index local" if RAG_BACKEND == "local" else "RPC match_nutrition_multi"
+        print(f"Erreur recherche RAG ({source}) : {e}")
+        return []
 
-def check_advice_exists(user_id):
-    """Vérifie si un conseil a déjà été généré aujourd'hui."""
-    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    today_end = today_start + timedelta(days=1)
-    
-    response = supabase.table("conseil_semaine").select("id").eq("id_utilisateur", user_id).gte("date_creation", today_start.isoformat()).lt("date_creation", today_end.isoformat()).execute()
-    
-    return len(response.data) > 0
+def compute_input_fingerprint(profile, profile_tag, seances, comps, intense_count, rag_context, load=None, today=None):
+    """Empreinte SHA-256 des entrées normalisées du prompt, à dates absolues.
 
-def generate_weekly_strategy(user_id):
+    Le prompt rendu ne convient pas : la charge chronique qu'il affiche glisse chaque jour. Seules
+    les colonnes lues par le prompt comptent ; de la charge, seul le dépassement du seuil
+    ACWR_HIGH (qui change les consignes et les requêtes RAG) est retenu. Le conseil, lui, est
+    rédigé en jours relatifs (J+n, périodisation à J+3/J+6) : le jour de la semaine de la
+    génération et les jours restants avant chaque compétition en font donc partie.
+    """
+    today = today or datetime.now().date()
+
+    def normalize(rows, columns):
+        cleaned = [{c: row.get(c) for c in columns} for row in rows]
+        return sorted(cleaned, key=lambda row: json.dumps(row, sort_keys=True, default=str))
+
+    def days_until(row):
+        day = str(row.get("date") or "")[:10]
+        return (datetime.fromisoformat(day).date() - today).days if day else None
+
+    ratio = (load or {}).get("ratio_aigu_chronique")
+    payload = {
+        "version": PROMPT_VERSION,
+        "prenom": profile.get("prenom"),
+        "profil": profile_tag,
+        "jour_semaine": today.weekday(),
+        "seances": normalize(seances, SESSION_COLUMNS),
+        "competitions": normalize(comps, COMPETITION_COLUMNS),
+        "jours_avant_competitions": sorted((d for d in map(days_until, comps) if d is not None)),
+        "intense_count": intense_count,
+        "charge_elevee": ratio is not None and ratio > ACWR_HIGH,
+        "rag": rag_context,
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+def find_reusable_advice(user_id, fingerprint, window_days):
+    """Dernier conseil généré par GPT-4o avec la même empreinte depuis moins de `window_days` jours.
+
+    Les copies (`id_source` renseigné) sont exclues : sinon chaque copie, datée du jour,
+    prolongerait la fenêtre et un même texte serait réutilisé indéfiniment.
+    """
+    since = datetime.now() - timedelta(days=window_days)
+    throttle("supabase")
+    with span("supabase.reutilisation"):
+        rows = get_supabase().table("conseil_semaine").select("id, conseil, date_creation").eq("id_utilisateur", user_id).eq("empreinte", fingerprint).eq("statut", "termine").is_("id_source", "null").gte("date_creation", since.isoformat()).order("date_creation", desc=True).limit(1).execute().data
+    return rows[0] if rows else None
+
+def generate_weekly_strategy(user_id, context=None, on_token=None):
+    """`context` : contexte préchargé par `prefetch_contexts` (sinon chargé ici en un aller-retour parallèle).
+    `on_token` : reçoit chaque token quand la complétion est streamée (STREAM_COMPLETIONS).
+    """
+    with user_scope(user_id), span("utilisateur"):
+        return _generate_weekly_strategy(user_id, context, on_token)
+
+def _generate_weekly_strategy(user_id, context, on_token):
     print(f"Génération de la stratégie pour l'utilisateur {user_id}...")
-    
+    if context is None:
+        with span("supabase.contexte"):
+            context = load_user_context(get_supabase(), user_id)
+
     # Check if advice already exists for today
-    if check_advice_exists(user_id):
+    if context["advice_exists"]:
         print("✅ Un conseil pour la semaine a déjà été généré aujourd'hui.")
         return None
 
     # 1. Collecte des données
-    profile, seances, comps = get_weekly_data(user_id)
+    profile, seances, comps = context["profile"], context["seances"], context["competitions"]
     if not profile:
         print("❌ Profil utilisateur introuvable.")
         return None
         
-    profile_tag = determine_profile_tag(profile)
+    # 2. Analyse de la charge (calculée pour tout le lot par prefetch_contexts, sinon ici)
+    load = context["charge"] if "charge" in context else compute_user_load(user_id, context)
+    if load:
+        intense_count = load["seances_intenses"]
+    else:
+        intense_count = len([s for s in seances if (s.get('intensité') or 0) >= 2]) # Score 2-3
+
+    profile_tag = determine_profile_tag(profile, load)
     print(f"Profil détecté : {profile_tag}")
     
-    # 2. Analyse de l'intensité
-    intense_count = len([s for s in seances if (s.get('intensité') or 0) >= 2]) # Score 2-3
-    
     # 3. Recherche RAG
     print("Recherche de contexte RAG...")
-    search_query = "Modèle méditerranéen, Oméga 3, équilibre acido-basique, charge glucidique compétition"
-    rag_context = retrieve_rag_context(search_query, profile_tag)
+    rag_queries = build_rag_queries(seances, comps, load)
+    print(f"Thèmes recherchés : {', '.join(q['theme'] for q in rag_queries)}")
+    rag_results = retrieve_rag_context(rag_queries, profile_tag)
 
-    # 4. Construction du Prompt Final
-    prompt = f"""
-    Tu es un expert en nutrition sportive. Génère la STRATÉGIE DE LA SEMAINE pour {profile.get('prenom', 'l\'utilisateur')}.
-    
-    DONNÉES UTILISATEUR :
-    - Profil : {profile_tag}
-    - Séances (J à J+6) : {json.dumps(seances, default=str)}
-    - Compétition proche : {json.dumps(comps, default=str)}
-    - Alerte Intensité : {intense_count} séances intenses détectées.
-    
-    CONTEXTE DU GUIDE NUTRITIONNEL :
-    {rag_context}
-    
-    CONSIGNES DE RÉDACTION (Prompt 3) :
-    - Analyse le volume global.
-    - Périodisation : 55% glucides par défaut, 70% si compétition à J+3 ou J+6.
-    - Alerte Inflammation : Si intense_count > 3, renforce les conseils anti-inflammatoires (IL-6/Hepcidine).
-    - Quotas : 400g poisson gras/semaine, 3 c.à.s huile colza/jour, oléagineux (Vit E).
-    - Zéro conseil médical. Ton direct et expert.
-    
-    FORMAT DE SORTIE :
-    1. Analyse de la Charge Hebdomadaire
-    2. Calendrier Stratégique (J à J+6)
-    3. Checklist "Courses & Stocks"
-    4. Conseil Prévention (Blessures & Alimentation Durable)
-    """
+    # 4. Construction du prompt dans le budget de tokens
+    with span("prompt.construction") as record:
+        prompt, rag_context, report = build_weekly_prompt(profile, profile_tag, seances, comps, intense_count,
+                                                rag_results, PROMPT_TOKEN_BUDGET, load)
+        if record is not None:
+            record.update(report)
+    approx = "" if report["comptage_exact"] else "~"
+    print(f"🧮 Prompt : {approx}{report['tokens']} tokens ({report['tokens_economises']} économisés sur le format brut, "
+          f"{report['extraits_retenus']}/{report['extraits_trouves']} extraits RAG)")
+    fingerprint = compute_input_fingerprint(profile, profile_tag, seances, comps, intense_count, rag_context, load)
 
+    # 5. Entrées identiques à un conseil récent : copie du conseil au lieu d'un appel GPT-4o
+    if ADVICE_REUSE_DAYS > 0:
+        previous = find_reusable_advice(user_id, fingerprint, ADVICE_REUSE_DAYS)
+        if previous:
+            print(f"♻️  Entrées inchangées depuis le conseil du {str(previous['date_creation'])[:10]} : réutilisation sans appel à GPT-4o.")
+            return save_weekly_advice(user_id, previous["conseil"], fingerprint, context.get("interrupted_advice_id"),
+                                      source_id=previous["id"])
+
+    with _timings_lock:
+        PROMPT_REPORTS.append(report)
     print("Appel à GPT-4o...")
-    response = client_ai.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.7
-    )
-    
-    advice_content = response.choices[0].message.content
+    advice_id = context.get("interrupted_advice_id")
+    if advice_id:
+        print(f"↩️  Reprise de la génération interrompue (conseil {advice_id}).")
+    if STREAM_COMPLETIONS:
+        advice_content, advice_id = stream_weekly_advice(user_id, prompt, fingerprint, advice_id, on_token, context)
+    else:
+        throttle("openai")
+        with span("openai.gpt4o"):
+            response = get_openai().chat.completions.create(
+                model="gpt-4o",
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.7
+            )
+            record_usage(response.usage)
+        advice_content = response.choices[0].message.content
     
-    # 5. Insertion en base
+    # 6. Insertion en base
+    return save_weekly_advice(user_id, advice_content, fingerprint, advice_id)
+
+def stream_weekly_advice(user_id, prompt, fingerprint, advice_id=None, on_token=None, context=None):
+    """Consomme la complétion en streaming : chaque token est transmis à `on_token` et le texte
+    partiel est sauvegardé (statut 'en_cours') au plus toutes les STREAM_PERSIST_SECONDS,
+    intervalle doublé après chaque échec (jusqu'à STREAM_PERSIST_MAX_SECONDS).
+
+    La ligne créée est notée dans `context["interrupted_advice_id"]` dès sa création : une
+    nouvelle tentative avec le même contexte (run_for_users) la reprend au lieu d'en créer une autre.
+    Retourne (texte complet, id de la ligne conseil_semaine créée ou reprise).
+    """
+    throttle("openai")
+    started = time.perf_counter()
+    parts = []
+    first_token_at = None
+    next_persist = started  # Première sauvegarde dès le premier token
+    failures = 0
+    with span("openai.gpt4o_stream") as record:
+        stream = get_openai().chat.completions.create(
+            model="gpt-4o",
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                record_usage(chunk.usage)  # Dernier événement du flux (include_usage)
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            token = chunk.choices[0].delta.content
+            parts.append(token)
+            if on_token:
+                on_token(token)
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+                if record is not None:
+                    record["ttft_ms"] = round((first_token_at - started) * 1000, 3)
+            if time.perf_counter() >= next_persist:
+                advice_id, saved = persist_partial_advice(user_id, "".join(parts), fingerprint, advice_id)
+                if context is not None:
+                    context["interrupted_advice_id"] = advice_id
+                failures = 0 if saved else failures + 1
+                next_persist = time.perf_counter() + min(STREAM_PERSIST_SECONDS * 2 ** failures, STREAM_PERSIST_MAX_SECONDS)
+
+    total = time.perf_counter() - started
+    ttft = (first_token_at or time.perf_counter()) - started
+    with _timings_lock:
+        LLM_TIMINGS.append((user_id, ttft, total))
+    if on_token:
+        print()
+    print(f"⏱️  Premier token après {ttft:.2f} s, génération complète en {total:.2f} s")
+    return "".join(parts), advice_id
+
+def persist_partial_advice(user_id, partial_content, fingerprint, advice_id):
+    """Crée ou met à jour la ligne 'en_cours' ; un échec n'interrompt pas le streaming.
+
+    Retourne (id de la ligne, sauvegarde réussie).
+    """
+    try:
+        throttle("supabase")
+        with span("supabase.sauvegarde_partielle"):
+            return _write_partial_advice(user_id, partial_content, fingerprint, advice_id), True
+    except Exception as e:
+        print(f"⚠️ Sauvegarde partielle impossible : {e}")
+    return advice_id, False
+
+def _write_partial_advice(user_id, partial_content, fingerprint, advice_id):
+    if advice_id is None:
+        row = {"id_utilisateur": user_id, "conseil": partial_content, "empreinte": fingerprint, "statut": "en_cours"}
+        return get_supabase().table("conseil_semaine").insert(row).execute().data[0]["id"]
+    get_supabase().table("conseil_semaine").update({"conseil": partial_content}).eq("id", advice_id).execute()
+    return advice_id
+
+def save_weekly_advice(user_id, advice_content, fingerprint, advice_id=None, source_id=None):
+    """Insère le conseil terminé, ou finalise la ligne 'en_cours' `advice_id`.
+    `source_id` : conseil recopié (réutilisation), None pour un conseil généré.
+
+    Un échec lève l'exception : l'utilisateur est compté en erreur (et retenté), pas ignoré.
+    """
     print("Insertion du conseil en base de données...")
     new_advice = {
         "id_utilisateur": user_id,
-        "conseil": advice_content
+        "conseil": advice_content,
+        "empreinte": fingerprint,
+        "statut": "termine",
+        "id_source": source_id
     }
     
     try:
-        supabase.table("conseil_semaine").insert(new_advice).execute()
+        throttle("supabase")
+        with span("supabase.insertion"):
+            if advice_id is None:
+                get_supabase().table("conseil_semaine").insert(new_advice).execute()
+            else:
+                get_supabase().table("conseil_semaine").update(new_advice).eq("id", advice_id).execute()
         print("✅ Stratégie hebdomadaire générée et sauvegardée avec succès.")
         return advice_content
     except Exception as e:
         print(f"❌ Erreur lors de la sauvegarde du conseil : {e}")
-        return None
+        raise
+
+def fetch_all_user_ids(page_size=1000):
+    """Liste les identifiants de toute la table profil_utilisateur (pagination)."""
+    user_ids = []
+    start = 0
+    while True:
+        throttle("supabase")
+        page = get_supabase().table("profil_utilisateur").select("id").order("id").range(start, start + page_size - 1).execute().data
+        user_ids.extend(row["id"] for row in page)
+        if len(page) < page_size:
+            return user_ids
+        start += page_size
+
+def read_users_file(path):
+    """Lit un fichier d'UUID (un par ligne, lignes vides et # ignorées)."""
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Génère la stratégie nutritionnelle de la semaine.")
+    parser.add_argument("user_id", nargs="?", help="UUID d'un utilisateur")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--all-users", action="store_true", help="Traite toute la table profil_utilisateur")
+    target.add_argument("--users-file", help="Fichier contenant un UUID par ligne")
+    parser.add_argument("--concurrency", type=int, default=8, help="Nombre d'utilisateurs traités en parallèle")
+    parser.add_argument("--openai-rpm", type=int, help="Limite de requêtes/minute vers OpenAI")
+    parser.add_argument("--supabase-rpm", type=int, help="Limite de requêtes/minute vers Supabase")
+    parser.add_argument("--retries", type=int, default=1, help="Nouvelles tentatives par utilisateur en échec")
+    parser.add_argument("--checkpoint", default=os.path.join(project_root, ".cache", "weekly_strategy_checkpoint.jsonl"),
+                        help="Journal des utilisateurs traités (JSON lines)")
+    parser.add_argument("--resume", action="store_true", help="Reprend un run interrompu à partir du journal")
+    parser.add_argument("--reuse-days", type=int, default=ADVICE_REUSE_DAYS,
+                        help="Réutilise un conseil de moins de N jours si les entrées sont identiques (0 = jamais)")
+    parser.add_argument("--stream", action="store_true", default=STREAM_COMPLETIONS,
+                        help="Streame la complétion GPT-4o (affichage immédiat, sauvegarde progressive)")
+    add_profile_arguments(parser)
+    parser.add_argument("--rag-backend", choices=["rpc", "local"], default=RAG_BACKEND,
+                        help="Recherche via l'RPC match_nutrition_multi ou via l'index NumPy local")
+    parser.add_argument("--index-precision", choices=PRECISIONS, default=RAG_INDEX_PRECISION,
+                        help="Stockage de l'index local : int8 = mémoire /4 à vitesse égale, float16 = mémoire /2 mais "
+                             "recherche plus lente (embedding_recall.py mesure rappel et latence)")
+    parser.add_argument("--prompt-budget", type=int, default=PROMPT_TOKEN_BUDGET,
+                        help="Budget de tokens du prompt (les extraits RAG sont coupés pour tenir)")
+    args = parser.parse_args(argv)
+    if not (args.user_id or args.all_users or args.users_file):
+        parser.error("Usage: python3 generate_weekly_strategy.py <UUID_UTILISATEUR> | --all-users | --users-file FICHIER")
+    return args
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python3 generate_weekly_strategy.py <UUID_UTILISATEUR>")
+    args = parse_args(sys.argv[1:])
+    try:
+        load_config()
+    except ConfigurationError as e:
+        print(f"❌ {e}")
         exit(1)
-    
-    user_uuid = sys.argv[1]
-    result = generate_weekly_strategy(user_uuid)
-    if result:
-        print("\n--- APPEL À L'ACTION ---")
-        print("Aperçu du conseil :")
-        print(result[:200] + "...")
+    RAG_BACKEND = args.rag_backend
+    ADVICE_REUSE_DAYS = args.reuse_days
+    STREAM_COMPLETIONS = args.stream
+    PROMPT_TOKEN_BUDGET = args.prompt_budget
+    RAG_INDEX_PRECISION = args.index_precision
+    configure_rate_limits(openai_rpm=args.openai_rpm, supabase_rpm=args.supabase_rpm)
+    configure_context_pool(args.concurrency)
+    start_profiling(args)
+
+    if args.user_id:
+        on_token = (lambda token: print(token, end="", flush=True)) if args.stream else None
+        result = generate_weekly_strategy(args.user_id, on_token=on_token)
+        if result:
+            print("\n--- APPEL À L'ACTION ---")
+            print("Aperçu du conseil :")
+            print(result[:200] + "...")
+        print(get_default_cache().summary())
+        finish_profiling(args)
+    else:
+        user_ids = fetch_all_user_ids() if args.all_users else read_users_file(args.users_file)
+        print(f"--- Génération pour {len(user_ids)} utilisateurs (concurrence : {args.concurrency}) ---")
+        done = load_checkpoint(args.checkpoint) if args.resume else set()
+        contexts = prefetch_contexts([u for u in user_ids if u not in done])
+        summary = asyncio.run(run_for_users(
+            user_ids,
+            lambda user_id: generate_weekly_strategy(user_id, context=contexts.get(user_id)),
+            concurrency=args.concurrency,
+            checkpoint_path=args.checkpoint,
+            resume=args.resume,
+            max_retries=args.retries,
+        ))
+        print_summary(summary)
+        if LLM_TIMINGS:
+            ttfts, totals = [t[1] for t in LLM_TIMINGS], [t[2] for t in LLM_TIMINGS]
+            print(f"⏱️  GPT-4o : premier token médian {statistics.median(ttfts):.2f} s, génération médiane {statistics.median(totals):.2f} s")
+        if PROMPT_REPORTS:
+            saved = sum(r["tokens_economises"] for r in PROMPT_REPORTS)
+            print(f"🧮 Prompts : {statistics.median(r['tokens'] for r in PROMPT_REPORTS):.0f} tokens médians, "
+                  f"{saved} tokens économisés au total sur {len(PROMPT_REPORTS)} prompts")
+        print(get_default_cache().summary())
+        finish_profiling(args)
+        if summary["erreur"]:
+            exit(1)
@@ -1,29 +1,25 @@
 import os
+import sys
 import json
-from openai import OpenAI
-from supabase import create_client
-from dotenv import load_dotenv
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from clients import ConfigurationError, get_openai, get_supabase, load_config, project_root
+from embedding_cache import EMBEDDING_DIMENSIONS, embedding_model_id, get_default_cache
+from instrumentation import add_profile_arguments, finish_profiling, record_usage, span, start_profiling
+from vector_index import DEFAULT_SNAPSHOT_PATH, NutritionIndex
+from pdf_source import CHUNK_OVERLAP, CHUNK_SIZE, iter_pdf_chunks
 
 # --- CONFIGURATION ---
-current_dir = os.path.dirname(os.path.abspath(__file__))
-project_root = os.path.dirname(current_dir)
-env_path = os.path.join(project_root, '.env.local')
-
-if os.path.exists(env_path):
-    load_dotenv(env_path, override=True)
-    SUPABASE_URL = os.getenv("SUPABASE_URL") or os.getenv("VITE_SUPABASE_URL")
-    SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("VITE_SUPABASE_SERVICE_KEY")
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-else:
-    print(f"❌ Fichier .env.local non trouvé à : {env_path}")
-    exit(1)
-
-if not OPENAI_API_KEY or not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
-    print("❌ Erreur : Variables d'environnement manquantes.")
-    exit(1)
-
-client_ai = OpenAI(api_key=OPENAI_API_KEY)
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+# Les clients OpenAI/Supabase sont construits au premier usage (voir clients.py)
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_MODEL_ID = embedding_model_id(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)  # Change de dimension => tout est ré-embeddé
+EMBEDDING_BATCH_SIZE = 100  # Textes par requête embeddings
+WRITE_BATCH_SIZE = 500      # Lignes par insert groupé
+UPDATE_CONCURRENCY = 8      # Mises à jour par id envoyées en parallèle (une requête par ligne)
+MANUAL_SOURCE = "manuel"    # Source des blocs saisis à la main ci-dessous
+DEFAULT_PDF_PATH = os.path.join(project_root, "Synthèse .pdf")
 
 # --- LES BLOCS DE CONNAISSANCES (L'intégralité du document) ---
 knowledge_chunks = [
@@ -159,40 +155,225 @@ knowledge_chunks = [
     }
 ]
 
+def _embed_api(texts):
+    with span("openai.embedding", textes=len(texts)):
+        response = get_openai().embeddings.create(
+            input=texts,
+            model=EMBEDDING_MODEL,
+            dimensions=EMBEDDING_DIMENSIONS
+        )
+        record_usage(response.usage)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+def generate_embeddings(texts):
+    """Crée les vecteurs d'un lot de textes (une seule requête pour ceux absents du cache)."""
+    return get_default_cache().embed(texts, EMBEDDING_MODEL_ID, _embed_api)
+
 def generate_embedding(text):
     """Crée le vecteur pour la recherche sémantique."""
-    response = client_ai.embeddings.create(
-        input=text,
-        model="text-embedding-3-small"
-    )
-    return response.data[0].embedding
-
-def automate_ingestion():
-    print(f"--- Début de l'ingestion de {len(knowledge_chunks)} blocs manuels ---")
-    
-    for i, block in enumerate(knowledge_chunks):
-        try:
-            # 1. Génération de l'embedding
-            embedding = generate_embedding(block['content'])
-            
-            # 2. Préparation de la ligne
-            row = {
-                "content": block['content'],
-                "embedding": embedding,
-                "metadata": {
-                    "horizon": block['metadata']['horizon'],
-                    "profil": block['metadata']['profil'],
-                    "theme": block['metadata']['theme'],
-                    "sources": block['sources']
-                }
-            }
-            
-            # 3. Insertion dans la table 'nutrition'
-            supabase.table("nutrition").insert(row).execute()
-            print(f"✅ Bloc {i+1}/{len(knowledge_chunks)} inséré (Profil: {block['metadata']['profil']})")
-            
-        except Exception as e:
-            print(f"❌ Erreur sur le bloc {i+1} : {e}")
+    return generate_embeddings([text])[0]
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def chunk_key(block):
+    """Identifiant stable d'un bloc : survit aux modifications de son contenu."""
+    return block.get("key") or f"{block['metadata']['theme']}-{block['sources'][0]}"
+
+def build_metadata(block, source):
+    return {
+        "horizon": block['metadata']['horizon'],
+        "profil": block['metadata']['profil'],
+        "theme": block['metadata']['theme'],
+        "sources": block['sources'],
+        "source": source,
+        "chunk_key": chunk_key(block),
+        "content_hash": content_hash(block['content']),
+        "embedding_model": EMBEDDING_MODEL_ID
+    }
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def fetch_existing_rows(source, page_size=1000):
+    """Charge (id, metadata, content_hash) des lignes de `nutrition` appartenant à `source`.
+
+    Le contenu n'est pas rapatrié, sauf pour les lignes insérées avant le suivi par
+    hash : elles n'ont ni `source` ni `content_hash` et sont rattachées aux blocs manuels.
+    """
+    rows, legacy_ids = [], []
+    start = 0
+    while True:
+        page = get_supabase().table("nutrition").select("id, metadata").order("id").range(start, start + page_size - 1).execute().data
+        for row in page:
+            meta = row.get("metadata") or {}
+            if meta.get("source", MANUAL_SOURCE) != source:
+                continue
+            rows.append({"id": row["id"], "metadata": meta, "content_hash": meta.get("content_hash")})
+            if not meta.get("content_hash"):
+                legacy_ids.append(row["id"])
+        if len(page) < page_size:
+            break
+        start += page_size
+
+    legacy_hashes = {}
+    for batch in _batches(legacy_ids, page_size):
+        for row in get_supabase().table("nutrition").select("id, content").in_("id", batch).execute().data:
+            legacy_hashes[row["id"]] = content_hash(row["content"])
+    for row in rows:
+        row["content_hash"] = row["content_hash"] or legacy_hashes.get(row["id"])
+    return rows
+
+def _update_row(row):
+    values = {k: v for k, v in row.items() if k != "id"}
+    get_supabase().table("nutrition").update(values).eq("id", row["id"]).execute()
+
+def _write_rows(op, rows):
+    """Insère de nouvelles lignes par lots, ou met à jour des lignes existantes par id.
+
+    `nutrition.id` est GENERATED ALWAYS : Postgres refuse un id explicite même dans un
+    upsert (erreur 428C9), d'où un update filtré par id pour chaque ligne existante.
+    """
+    for batch in _batches(rows, WRITE_BATCH_SIZE):
+        with span(f"supabase.{op}", lignes=len(batch)):
+            if op == "insert":
+                get_supabase().table("nutrition").insert(batch).execute()
+            else:
+                with ThreadPoolExecutor(max_workers=UPDATE_CONCURRENCY) as executor:
+                    list(executor.map(_update_row, batch))
+
+def sync_chunks(blocks, source=MANUAL_SOURCE):
+    """Synchronise la table `nutrition` avec `blocks` (itérable, consommé par lots).
+
+    - bloc inchangé (même hash, même modèle) : ignoré ;
+    - métadonnées modifiées seulement : mises à jour sans nouvel embedding ;
+    - contenu modifié : ré-embeddé et mis à jour sur place ;
+    - nouveau bloc : embeddé et inséré ;
+    - ligne sans bloc correspondant (bloc supprimé ou doublon) : supprimée.
+    """
+    by_key, legacy_by_hash = {}, {}
+    stale_ids = []
+    with span("supabase.lecture"):
+        existing_rows = fetch_existing_rows(source)
+    for row in existing_rows:
+        meta = row.get("metadata") or {}
+        key = meta.get("chunk_key")
+        if key and key not in by_key:
+            by_key[key] = row
+        elif not key and row["content_hash"] not in legacy_by_hash:
+            legacy_by_hash[row["content_hash"]] = row
+        else:
+            stale_ids.append(row["id"])  # Doublon d'une ingestion précédente
+
+    stats = {"inchangés": 0, "métadonnées": 0, "modifiés": 0, "nouveaux": 0, "supprimés": 0, "appels_embedding": 0}
+    api_calls_before = get_default_cache().stats["api_calls"]
+    claimed = set()
+
+    for batch in _batches(blocks, EMBEDDING_BATCH_SIZE):
+        to_embed, meta_updates = [], []
+        for block in batch:
+            metadata = build_metadata(block, source)
+            existing = by_key.get(metadata["chunk_key"]) or legacy_by_hash.get(metadata["content_hash"])
+            if existing and existing["id"] in claimed:
+                existing = None
+            if existing:
+                claimed.add(existing["id"])
+            old_meta = (existing or {}).get("metadata") or {}
+            same_vector = existing and existing["content_hash"] == metadata["content_hash"] \
+                and old_meta.get("embedding_model", EMBEDDING_MODEL) == EMBEDDING_MODEL_ID
+            if same_vector and old_meta == metadata:
+                stats["inchangés"] += 1
+            elif same_vector:
+                meta_updates.append({"id": existing["id"], "content": block['content'], "metadata": metadata})
+            else:
+                to_embed.append((existing, block, metadata))
+
+        if to_embed:
+            embeddings = generate_embeddings([block['content'] for _, block, _ in to_embed])
+            inserts, updates = [], []
+            for (existing, block, metadata), embedding in zip(to_embed, embeddings):
+                row = {"content": block['content'], "embedding": embedding, "metadata": metadata}
+                if existing:
+                    updates.append({"id": existing["id"], **row})
+                else:
+                    inserts.append(row)
+            _write_rows("insert", inserts)
+            _write_rows("update", updates)
+            stats["nouveaux"] += len(inserts)
+            stats["modifiés"] += len(updates)
+
+        _write_rows("update", meta_updates)
+        stats["métadonnées"] += len(meta_updates)
+
+    existing_ids = [r["id"] for r in by_key.values()] + [r["id"] for r in legacy_by_hash.values()]
+    stale_ids += [row_id for row_id in existing_ids if row_id not in claimed]
+    for batch in _batches(stale_ids, WRITE_BATCH_SIZE):
+        with span("supabase.delete", lignes=len(batch)):
+            get_supabase().table("nutrition").delete().in_("id", batch).execute()
+    stats["supprimés"] = len(stale_ids)
+    stats["appels_embedding"] = get_default_cache().stats["api_calls"] - api_calls_before
+    return stats
+
+def automate_ingestion(blocks=None, source=MANUAL_SOURCE, label=None):
+    """Ingère `blocks` (par défaut les blocs manuels) sous `source`."""
+    if blocks is None:
+        blocks = knowledge_chunks
+    label = label or f"{len(knowledge_chunks)} blocs manuels"
+    print(f"--- Début de l'ingestion de {label} ---")
+
+    try:
+        with span("ingestion", source=source):
+            stats = sync_chunks(blocks, source=source)
+    except Exception as e:
+        print(f"❌ Erreur pendant l'ingestion : {e}")
+        return
+
+    print(f"✅ {stats['nouveaux']} insérés, {stats['modifiés']} ré-embeddés, "
+          f"{stats['métadonnées']} métadonnées mises à jour, {stats['inchangés']} inchangés, "
+          f"{stats['supprimés']} supprimés ({stats['appels_embedding']} appels embeddings)")
+    print(get_default_cache().summary())
+
+    # Le snapshot de l'index local doit refléter la table après modification
+    changed = stats['nouveaux'] + stats['modifiés'] + stats['métadonnées'] + stats['supprimés']
+    if changed and os.path.exists(DEFAULT_SNAPSHOT_PATH + ".npy"):
+        with span("index.snapshot"):
+            NutritionIndex.from_supabase(get_supabase()).save(DEFAULT_SNAPSHOT_PATH)
+        print(f"✅ Snapshot de l'index local régénéré : {DEFAULT_SNAPSHOT_PATH}")
+
+def ingest_pdf(path, workers=None, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Ingère un PDF page par page ; ses blocs sont synchronisés sous la source `nom du fichier`."""
+    source = os.path.basename(path)
+    chunks = iter_pdf_chunks(path, source=source, workers=workers, chunk_size=chunk_size, overlap=overlap)
+    automate_ingestion(chunks, source=source, label=f"« {source} »")
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Ingestion de la base de connaissances nutritionnelles.")
+    parser.add_argument("--pdf", nargs="*", metavar="CHEMIN",
+                        help=f"Ingère un ou plusieurs PDF (sans chemin : {os.path.basename(DEFAULT_PDF_PATH)})")
+    parser.add_argument("--workers", type=int, help="Processus d'extraction des pages (défaut : nombre de CPU)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Taille des blocs en caractères")
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP, help="Chevauchement entre blocs en caractères")
+    add_profile_arguments(parser)
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    automate_ingestion()
\ No newline at end of file
+    args = parse_args(sys.argv[1:])
+    try:
+        load_config()
+    except ConfigurationError as e:
+        print(f"❌ {e}")
+        exit(1)
+    start_profiling(args)
+    if args.pdf is None:
+        automate_ingestion()
+    else:
+        for path in args.pdf or [DEFAULT_PDF_PATH]:
+            ingest_pdf(path, workers=args.workers, chunk_size=args.chunk_size, overlap=args.overlap)
+    finish_profiling(args)
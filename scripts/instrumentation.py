@@ -0,0 +1,197 @@
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# --- ÉTAT ---
+
+_enabled = False
+_spans = []
+_retries = {}
+_lock = threading.Lock()
+_jsonl = None
+_profilers = []  # Profileur du thread principal, puis un par thread démarré pendant le profilage
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_current_user = contextvars.ContextVar("current_user", default=None)
+
+TOKEN_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens")
+
+def enable(jsonl_path=None):
+    """Active la collecte ; chaque span terminé est aussi écrit en JSON lines dans `jsonl_path`."""
+    global _enabled, _jsonl
+    _enabled = True
+    if jsonl_path:
+        _jsonl = open(jsonl_path, "a", encoding="utf-8")
+
+def is_enabled():
+    return _enabled
+
+def reset():
+    """Efface les spans et compteurs collectés (runs successifs d'un benchmark)."""
+    with _lock:
+        _spans.clear()
+        _retries.clear()
+
+# --- SPANS ---
+
+@contextmanager
+def user_scope(user_id):
+    """Rattache les spans du thread courant à `user_id`."""
+    token = _current_user.set(user_id)
+    try:
+        yield
+    finally:
+        _current_user.reset(token)
+
+@contextmanager
+def span(stage, **attrs):
+    """Mesure la durée d'une étape (Supabase, embedding, RPC, GPT-4o...) pour l'utilisateur courant."""
+    if not _enabled:
+        yield None
+        return
+    record = {"stage": stage, "user_id": _current_user.get(), "ok": True, **attrs}
+    token = _current_span.set(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    except BaseException:
+        record["ok"] = False
+        raise
+    finally:
+        record["duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        _current_span.reset(token)
+        with _lock:
+            _spans.append(record)
+            if _jsonl:
+                _jsonl.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                _jsonl.flush()
+
+def record_usage(usage):
+    """Ajoute l'usage OpenAI (tokens prompt/complétion) au span courant."""
+    record = _current_span.get()
+    if record is None or usage is None:
+        return
+    for field in TOKEN_FIELDS:
+        value = getattr(usage, field, None)
+        if value is not None:
+            record[field] = record.get(field, 0) + value
+
+def current_stage():
+    """Étape du span en cours dans ce thread (None hors span)."""
+    record = _current_span.get()
+    return record["stage"] if record else None
+
+def record_retry(stage):
+    if not _enabled:
+        return
+    with _lock:
+        _retries[stage] = _retries.get(stage, 0) + 1
+
+# --- RESTITUTION ---
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def summarize():
+    """Agrège les spans par étape : nombre, erreurs, durées (total, p50, p95, max) et tokens."""
+    with _lock:
+        spans = list(_spans)
+        retries = dict(_retries)
+    stages = {stage: [] for stage in retries}  # Nouvelles tentatives hors span (ex. HTTP) : ligne sans durée
+    for record in spans:
+        stages.setdefault(record["stage"], []).append(record)
+    summary = {}
+    for stage, records in stages.items():
+        durations = sorted(r["duration_ms"] for r in records)
+        summary[stage] = {
+            "count": len(records),
+            "errors": sum(1 for r in records if not r["ok"]),
+            "retries": retries.get(stage, 0),
+            "total_s": round(sum(durations) / 1000, 3),
+            "p50_ms": round(_percentile(durations, 0.5), 1),
+            "p95_ms": round(_percentile(durations, 0.95), 1),
+            "max_ms": round(durations[-1] if durations else 0.0, 1),
+            **{field: sum(r.get(field, 0) for r in records) for field in TOKEN_FIELDS},
+        }
+    return summary
+
+def print_summary_table():
+    summary = summarize()
+    if not summary:
+        return
+    print("\n--- PROFIL D'EXÉCUTION ---")
+    header = f"{'étape':<30}{'n':>6}{'err':>5}{'retry':>6}{'total s':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'tok in':>9}{'tok out':>9}"
+    print(header)
+    print("-" * len(header))
+    for stage, s in sorted(summary.items(), key=lambda item: -item[1]["total_s"]):
+        print(f"{stage:<30}{s['count']:>6}{s['errors']:>5}{s['retries']:>6}{s['total_s']:>10.2f}"
+              f"{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['max_ms']:>10.1f}{s['prompt_tokens']:>9}{s['completion_tokens']:>9}")
+
+# --- INTÉGRATION CLI ---
+
+def add_profile_arguments(parser):
+    parser.add_argument("--profile", action="store_true", help="Affiche le temps passé par étape et l'usage de tokens")
+    parser.add_argument("--profile-out", metavar="FICHIER.jsonl", help="Écrit chaque span en JSON lines (active --profile)")
+    parser.add_argument("--cprofile", metavar="FICHIER.prof", help="Enregistre un profil cProfile (tous les threads)")
+
+# Jusqu'à Python 3.11, cProfile ne suit que le thread qui l'active : chaque thread démarré pendant
+# le profilage (pools de worker_pool, user_context, worker.py) reçoit son propre profileur via
+# threading.setprofile, et tous sont fusionnés dans le fichier. Depuis 3.12, cProfile repose sur
+# sys.monitoring et voit déjà tous les threads, mais sur une seule pile d'appels : les temps cumulés
+# des fonctions exécutées en parallèle y sont approximatifs.
+PER_THREAD_PROFILERS = sys.version_info < (3, 12)
+
+def _profile_thread(frame, event, arg):
+    """Hook threading.setprofile : au premier événement d'un nouveau thread, y active un profileur."""
+    sys.setprofile(None)
+    profiler = cProfile.Profile()
+    with _lock:
+        _profilers.append(profiler)
+    profiler.enable()
+
+def _dump_profiles(path):
+    with _lock:
+        profilers = list(_profilers)
+        _profilers.clear()
+    stats = None
+    for profiler in profilers:
+        profiler.create_stats()
+        if not profiler.stats:
+            continue  # Thread sans appel profilé : pstats refuse un profil vide
+        if stats is None:
+            stats = pstats.Stats(profiler)
+        else:
+            stats.add(profiler)
+    if stats is not None:
+        stats.dump_stats(path)
+    return len(profilers)
+
+def start_profiling(args):
+    if args.profile or args.profile_out:
+        enable(args.profile_out)
+    if args.cprofile:
+        profiler = cProfile.Profile()
+        _profilers.append(profiler)
+        profiler.enable()
+        if PER_THREAD_PROFILERS:
+            threading.setprofile(_profile_thread)
+
+def finish_profiling(args):
+    global _jsonl
+    if args.cprofile:
+        threading.setprofile(None)
+        threads = _dump_profiles(args.cprofile)
+        print(f"🧪 Profil cProfile écrit dans {args.cprofile} ({threads} threads)")
+    if _enabled:
+        print_summary_table()
+    if _jsonl:
+        _jsonl.close()
+        _jsonl = None
@@ -0,0 +1,187 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from clients import project_root
+from worker_pool import throttle
+
+# File de jobs de génération consommée par worker.py. Un job = (utilisateur, type).
+# Cycle de vie : en_attente -> en_cours (bail de `lease_seconds`) -> termine | ignore | echec.
+# Un job 'en_cours' dont le bail a expiré (worker tué) redevient réclamable, sauf s'il a déjà
+# épuisé ses essais : il passe alors en 'echec' (un job qui tue ou bloque son worker n'est pas
+# repris indéfiniment).
+
+DEFAULT_QUEUE_PATH = os.path.join(project_root, ".cache", "jobs.sqlite3")
+DEFAULT_JOB_KIND = "semaine"
+ACTIVE_STATUSES = ("en_attente", "en_cours")
+RETRY_DELAY_SECONDS = 30  # Délai avant nouvelle tentative, multiplié par le nombre d'essais
+EXPIRED_LEASE_ERROR = "Bail expiré après le dernier essai (worker tué ou bloqué)"
+
+def _retry_delay(attempts):
+    return RETRY_DELAY_SECONDS * max(1, attempts)
+
+class SQLiteJobQueue:
+    """File locale (un fichier SQLite) ; plusieurs workers du même hôte peuvent la partager."""
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                id_utilisateur TEXT NOT NULL,
+                type TEXT NOT NULL,
+                statut TEXT NOT NULL DEFAULT 'en_attente',
+                tentatives INTEGER NOT NULL DEFAULT 0,
+                disponible_a REAL NOT NULL,
+                bail_jusqua REAL,
+                erreur TEXT,
+                date_creation REAL NOT NULL,
+                date_maj REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_statut ON jobs (statut, disponible_a)")
+
+    def enqueue(self, user_ids, kind=DEFAULT_JOB_KIND):
+        """Ajoute un job par utilisateur, sauf s'il en a déjà un en attente ou en cours. Retourne le nombre ajouté."""
+        now = time.time()
+        added = 0
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for user_id in dict.fromkeys(user_ids):
+                    active = self._db.execute(
+                        "SELECT 1 FROM jobs WHERE id_utilisateur = ? AND type = ? AND statut IN (?, ?)",
+                        (user_id, kind, *ACTIVE_STATUSES),
+                    ).fetchone()
+                    if active:
+                        continue
+                    self._db.execute(
+                        "INSERT INTO jobs (id_utilisateur, type, disponible_a, date_creation, date_maj) VALUES (?, ?, ?, ?, ?)",
+                        (user_id, kind, now, now, now),
+                    )
+                    added += 1
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return added
+
+    def claim(self, limit, lease_seconds, max_attempts=None):
+        """Réserve au plus `limit` jobs disponibles (transaction exclusive : pas de double réservation).
+
+        Les baux expirés de jobs ayant déjà eu `max_attempts` essais sont clos en 'echec'.
+        """
+        if limit <= 0:
+            return []
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if max_attempts is not None:
+                    self._db.execute(
+                        """UPDATE jobs SET statut = 'echec', bail_jusqua = NULL, erreur = ?, date_maj = ?
+                           WHERE statut = 'en_cours' AND bail_jusqua < ? AND tentatives >= ?""",
+                        (EXPIRED_LEASE_ERROR, now, now, max_attempts),
+                    )
+                rows = self._db.execute(
+                    """SELECT id, id_utilisateur, type, tentatives FROM jobs
+                       WHERE (statut = 'en_attente' AND disponible_a <= ?) OR (statut = 'en_cours' AND bail_jusqua < ?)
+                       ORDER BY disponible_a, id LIMIT ?""",
+                    (now, now, limit),
+                ).fetchall()
+                self._db.executemany(
+                    "UPDATE jobs SET statut = 'en_cours', tentatives = tentatives + 1, bail_jusqua = ?, date_maj = ? WHERE id = ?",
+                    [(now + lease_seconds, now, row["id"]) for row in rows],
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return [{"id": r["id"], "user_id": r["id_utilisateur"], "kind": r["type"], "attempts": r["tentatives"] + 1} for r in rows]
+
+    def complete(self, job, status="termine"):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET statut = ?, bail_jusqua = NULL, erreur = NULL, date_maj = ? WHERE id = ?",
+                             (status, time.time(), job["id"]))
+
+    def fail(self, job, error, max_attempts):
+        """Remet le job en attente (avec délai) ou le marque 'echec' après `max_attempts` essais."""
+        now = time.time()
+        final = job["attempts"] >= max_attempts
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET statut = ?, disponible_a = ?, bail_jusqua = NULL, erreur = ?, date_maj = ? WHERE id = ?",
+                ("echec" if final else "en_attente", now + _retry_delay(job["attempts"]), error, now, job["id"]),
+            )
+        return final
+
+    def counts(self):
+        with self._lock:
+            return {row[0]: row[1] for row in self._db.execute("SELECT statut, COUNT(*) FROM jobs GROUP BY statut")}
+
+class SupabaseJobQueue:
+    """File partagée entre hôtes : table `file_generation` et fonction `claim_generation_jobs` (schema.sql)."""
+
+    table = "file_generation"
+
+    def __init__(self, supabase):
+        self.supabase = supabase
+
+    def _update(self, job, values):
+        throttle("supabase")
+        values["date_maj"] = datetime.now(timezone.utc).isoformat()
+        self.supabase.table(self.table).update(values).eq("id", job["id"]).execute()
+
+    def enqueue(self, user_ids, kind=DEFAULT_JOB_KIND, batch_size=200):
+        user_ids = list(dict.fromkeys(user_ids))
+        added = 0
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            throttle("supabase")
+            active = self.supabase.table(self.table).select("id_utilisateur").eq("type", kind).in_("statut", list(ACTIVE_STATUSES)).in_("id_utilisateur", batch).execute().data
+            skip = {row["id_utilisateur"] for row in active}
+            rows = [{"id_utilisateur": u, "type": kind} for u in batch if u not in skip]
+            if rows:
+                throttle("supabase")
+                self.supabase.table(self.table).insert(rows).execute()
+                added += len(rows)
+        return added
+
+    def claim(self, limit, lease_seconds, max_attempts=None):
+        if limit <= 0:
+            return []
+        throttle("supabase")
+        rows = self.supabase.rpc("claim_generation_jobs", {"p_limit": limit, "p_lease_seconds": lease_seconds,
+                                                           "p_max_attempts": max_attempts}).execute().data
+        return [{"id": r["id"], "user_id": r["id_utilisateur"], "kind": r["type"], "attempts": r["tentatives"]} for r in rows]
+
+    def complete(self, job, status="termine"):
+        self._update(job, {"statut": status, "bail_jusqua": None, "erreur": None})
+
+    def fail(self, job, error, max_attempts):
+        final = job["attempts"] >= max_attempts
+        available = datetime.now(timezone.utc) + timedelta(seconds=_retry_delay(job["attempts"]))
+        self._update(job, {"statut": "echec" if final else "en_attente", "disponible_a": available.isoformat(),
+                           "bail_jusqua": None, "erreur": error})
+        return final
+
+    def counts(self):
+        counts = {}
+        for status in ACTIVE_STATUSES + ("termine", "ignore", "echec"):
+            throttle("supabase")
+            response = self.supabase.table(self.table).select("id", count="exact").eq("statut", status).limit(1).execute()
+            counts[status] = response.count or 0
+        return {k: v for k, v in counts.items() if v}
+
+def open_queue(backend, path=DEFAULT_QUEUE_PATH):
+    """`backend` : "sqlite" (fichier local) ou "supabase" (table partagée)."""
+    if backend == "supabase":
+        from clients import get_supabase
+        return SupabaseJobQueue(get_supabase())
+    return SQLiteJobQueue(path)
@@ -0,0 +1,139 @@
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from PyPDF2 import PdfReader
+
+PAGES_PER_TASK = 4   # Pages extraites par tâche du pool
+CHUNK_SIZE = 1200    # Caractères par bloc
+CHUNK_OVERLAP = 200  # Caractères repris du bloc précédent
+
+# --- LECTURE PAGE PAR PAGE ---
+
+def _normalize(text):
+    # PyPDF2 sépare souvent chaque mot par " \n" : on ramène tout à des espaces simples
+    return re.sub(r"\s+", " ", text or "").strip()
+
+_reader = None  # Lecteur du processus courant, ouvert une seule fois par _open_reader
+
+def _open_reader(path):
+    """Initialiseur du pool : un lecteur par processus, xref analysée une seule fois.
+
+    Le lecteur reçoit le fichier ouvert plutôt que son chemin : PyPDF2 lit alors les objets
+    à la demande au lieu de copier tout le document en mémoire.
+    """
+    global _reader
+    _reader = PdfReader(open(path, "rb"))
+
+def _extract_pages(start, end):
+    """Tâche exécutée dans un processus du pool : texte des pages [start, end)."""
+    return [(number + 1, _normalize(_reader.pages[number].extract_text())) for number in range(start, end)]
+
+def iter_pdf_pages(path, workers=None, pages_per_task=PAGES_PER_TASK):
+    """Génère (numéro de page, texte) dans l'ordre, l'extraction étant répartie sur un pool de processus.
+
+    Au plus `2 * workers` tâches sont en vol et chaque processus lit le fichier à la demande :
+    la mémoire ne dépend pas de la taille du document.
+    """
+    with open(path, "rb") as f:
+        page_count = len(PdfReader(f).pages)
+    workers = workers or os.cpu_count() or 1
+    ranges = ((start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task))
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_open_reader, initargs=(path,)) as executor:
+        in_flight = deque()
+        for start, end in ranges:
+            in_flight.append(executor.submit(_extract_pages, start, end))
+            if len(in_flight) >= 2 * workers:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+# --- DÉCOUPAGE AVEC CHEVAUCHEMENT ---
+
+def iter_text_chunks(pages, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Découpe un flux de pages en blocs d'environ `chunk_size` caractères.
+
+    Chaque bloc reprend les derniers mots (≈ `overlap` caractères) du précédent et
+    est retourné avec la liste des pages qu'il couvre.
+    """
+    words = []  # (mot, page)
+    length = fresh = 0
+
+    def emit():
+        pages_covered = sorted({page for _, page in words})
+        return " ".join(word for word, _ in words), pages_covered
+
+    for page_number, text in pages:
+        for word in text.split():
+            words.append((word, page_number))
+            length += len(word) + 1
+            fresh += 1
+            if length >= chunk_size:
+                yield emit()
+                tail, tail_length = [], 0
+                for item in reversed(words):
+                    if tail_length + len(item[0]) + 1 > overlap:
+                        break
+                    tail.append(item)
+                    tail_length += len(item[0]) + 1
+                words, length, fresh = tail[::-1], tail_length, 0
+    if fresh:
+        yield emit()
+
+# --- MÉTADONNÉES ---
+
+THEME_KEYWORDS = {
+    "competition": ["compétition", "j-3", "j-6", "jj", "ration d'attente", "épreuve"],
+    "hydratation": ["hydrat", "boisson", "eau", "osmolarité", "sodium"],
+    "recuperation": ["récupération", "après l'effort", "post-effort"],
+    "proteines": ["protéine", "acides aminés", "bcaa", "leucine", "glutamine"],
+    "lipides": ["oméga", "lipide", "colza", "huile"],
+    "glucides": ["glucide", "glycogène", "index glycémique", "ig bas"],
+    "micronutriments": ["zinc", "magnésium", "sélénium", "vitamine", "fer"],
+    "alcalin": ["alcalin", "pral"],
+    "acide": ["acidifiant"],
+    "chronobiologie": ["chronobiologie", "petit déjeuner", "dîner"],
+    "physiologie": ["interleukine", "hepcidine", "fc max", "fréquence cardiaque"],
+}
+
+PROFIL_KEYWORDS = {
+    "REM": ["remise en mouvement", "sédentaire"],
+    "faible": ["sportif faible"],
+    "modere": ["sportif modéré", "modérément intense"],
+    "haut_niveau": ["haut niveau", "+10h/semaine"],
+}
+
+HORIZON_KEYWORDS = {
+    "week": ["semaine", "compétition", "j-6", "j-3", "charge glucidique"],
+    "seance": ["séance", "pendant l'effort", "après l'effort", "avant l'effort", "épreuve"],
+}
+
+def _best_match(text, keywords, default):
+    # Mots-clés comptés en début de mot ("eau" ne doit pas compter dans "nouveau")
+    scores = {label: sum(len(re.findall(r"(?<!\w)" + re.escape(k), text)) for k in words) for label, words in keywords.items()}
+    label, score = max(scores.items(), key=lambda item: item[1])
+    return label if score else default
+
+def classify_chunk(text):
+    """Attribue horizon/profil/thème à un bloc par mots-clés (mêmes valeurs que les blocs manuels)."""
+    lowered = text.lower().replace("’", "'")
+    return {
+        "horizon": _best_match(lowered, HORIZON_KEYWORDS, "jour"),
+        "profil": _best_match(lowered, PROFIL_KEYWORDS, "tous"),
+        "theme": _best_match(lowered, THEME_KEYWORDS, "general"),
+    }
+
+def iter_pdf_chunks(path, source=None, workers=None, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Flux de blocs au format de `knowledge_chunks` (content, sources = pages, metadata) pour un PDF."""
+    source = source or os.path.basename(path)
+    last_page, index = None, 0
+    for content, pages in iter_text_chunks(iter_pdf_pages(path, workers=workers), chunk_size, overlap):
+        index = index + 1 if pages[0] == last_page else 0
+        last_page = pages[0]
+        yield {
+            "key": f"{source}:p{pages[0]}:{index}",
+            "content": content,
+            "sources": pages,
+            "metadata": classify_chunk(content),
+        }
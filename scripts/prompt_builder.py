@@ -0,0 +1,176 @@
+import os
+import json
+import math
+import threading
+from datetime import date, datetime
+from training_load import format_load_summary
+
+try:
+    import tiktoken  # Comptage exact (requirements.txt) ; sans lui, estimation ~4 caractères par token
+except ImportError:
+    tiktoken = None
+
+# Construction du prompt de la stratégie hebdomadaire dans un budget de tokens :
+# séances et compétitions en tableau compact (seules les colonnes utilisées par les
+# consignes), extraits RAG pris dans l'ordre du classement tant que le budget le permet.
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2000"))
+PROMPT_MODEL = "gpt-4o"
+JOURS = ["lun", "mar", "mer", "jeu", "ven", "sam", "dim"]
+SESSION_COLUMNS = ("date", "période_journée", "sport", "type", "durée", "intensité")  # Colonnes lues par le prompt
+COMPETITION_COLUMNS = ("date", "sport", "durée", "distance", "intensité")
+
+_encoding = None  # Encodage tiktoken, chargé au premier appel ; False : indisponible, estimation
+_encoding_lock = threading.Lock()
+
+def _load_encoding():
+    """tiktoken télécharge l'encodage au premier usage (puis le garde dans TIKTOKEN_CACHE_DIR) :
+    sans réseau, on se replie une fois pour toutes sur l'estimation au lieu d'échouer à chaque prompt.
+    """
+    if tiktoken is None:
+        return False
+    try:
+        return tiktoken.encoding_for_model(PROMPT_MODEL)
+    except Exception as e:
+        print(f"⚠️ Encodage tiktoken indisponible ({e}) : tokens estimés (~4 caractères par token).")
+        return False
+
+def count_tokens(text):
+    """Nombre de tokens du texte pour GPT-4o (tiktoken si son encodage est disponible, sinon estimation)."""
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                _encoding = _load_encoding()
+    if _encoding is False:
+        return math.ceil(len(text) / 4)
+    return len(_encoding.encode(text))
+
+def exact_token_count():
+    """True si count_tokens compte avec tiktoken, False s'il estime."""
+    count_tokens("")
+    return _encoding is not False
+
+# --- TABLEAUX COMPACTS ---
+
+def _parse_day(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value)[:10]).date()
+    except ValueError:
+        return None
+
+def _cell(value):
+    if value is None or value == "":
+        return "-"
+    return str(value).replace("|", "/").replace("\n", " ")
+
+def _day_label(value, today):
+    day = _parse_day(value)
+    if day is None:
+        return "-"
+    return f"J+{(day - today).days} {JOURS[day.weekday()]}"
+
+def compact_sessions(seances, today=None):
+    """Séances triées par date : jour relatif, moment, sport, type, durée (min), intensité (1-3)."""
+    if not seances:
+        return "aucune"
+    today = today or date.today()
+    lines = ["jour|moment|sport|type|min|int"]
+    for s in sorted(seances, key=lambda s: str(s.get("date") or "")):
+        lines.append("|".join([_day_label(s.get("date"), today)] + [_cell(s.get(c)) for c in SESSION_COLUMNS[1:]]))
+    return "\n".join(lines)
+
+def compact_competitions(comps, today=None):
+    """Compétitions triées par date : jour relatif, sport, durée (min), distance, intensité."""
+    if not comps:
+        return "aucune"
+    today = today or date.today()
+    lines = ["jour|sport|min|dist|int"]
+    for c in sorted(comps, key=lambda c: str(c.get("date") or "")):
+        lines.append("|".join([_day_label(c.get("date"), today)] + [_cell(c.get(col)) for col in COMPETITION_COLUMNS[1:]]))
+    return "\n".join(lines)
+
+# --- CONTEXTE RAG ---
+
+def select_rag_chunks(results, budget_tokens):
+    """Extraits dans l'ordre du classement RAG (doublons retirés), tant qu'ils tiennent dans `budget_tokens`."""
+    selected, used, seen = [], 0, set()
+    for result in results:
+        content = result["content"].strip()
+        if content in seen:
+            continue
+        seen.add(content)
+        cost = count_tokens(f"- {content}\n")
+        if used + cost > budget_tokens:
+            continue  # Un extrait plus court, moins bien classé, peut encore tenir
+        selected.append(result)
+        used += cost
+    return selected
+
+def format_rag_context(chunks):
+    return "\n".join(f"- {chunk['content'].strip()}" for chunk in chunks)
+
+# --- PROMPT ---
+
+def render_weekly_prompt(first_name, profile_tag, sessions_text, competitions_text, intense_count, rag_context, load_summary):
+    return f"""
+    Tu es un expert en nutrition sportive. Génère la STRATÉGIE DE LA SEMAINE pour {first_name}.
+
+    DONNÉES UTILISATEUR :
+    - Profil : {profile_tag}
+    - Séances (J à J+6, int = intensité 1-3) :
+{sessions_text}
+    - Compétition proche :
+{competitions_text}
+    - Alerte Intensité : {intense_count} séances intenses détectées.
+    - Charge d'entraînement : {load_summary}
+
+    CONTEXTE DU GUIDE NUTRITIONNEL :
+    {rag_context}
+
+    CONSIGNES DE RÉDACTION (Prompt 3) :
+    - Analyse le volume global.
+    - Périodisation : 55% glucides par défaut, 70% si compétition à J+3 ou J+6.
+    - Alerte Inflammation : Si intense_count > 3, renforce les conseils anti-inflammatoires (IL-6/Hepcidine).
+    - Charge : si le ratio aigu:chronique dépasse 1.5, priorise la récupération et la prévention des blessures.
+    - Quotas : 400g poisson gras/semaine, 3 c.à.s huile colza/jour, oléagineux (Vit E).
+    - Zéro conseil médical. Ton direct et expert.
+
+    FORMAT DE SORTIE :
+    1. Analyse de la Charge Hebdomadaire
+    2. Calendrier Stratégique (J à J+6)
+    3. Checklist "Courses & Stocks"
+    4. Conseil Prévention (Blessures & Alimentation Durable)
+    """
+
+def build_weekly_prompt(profile, profile_tag, seances, comps, intense_count, rag_results, budget_tokens=None, load=None):
+    """Retourne (prompt, contexte RAG retenu, rapport de tokens).
+
+    Le budget couvre tout le prompt : les extraits RAG reçoivent ce qui reste après les
+    données utilisateur et les consignes. Le rapport compare au format brut précédent
+    (lignes JSON complètes et tous les extraits).
+    """
+    budget_tokens = PROMPT_TOKEN_BUDGET if budget_tokens is None else budget_tokens
+    first_name = profile.get("prenom") or "l'utilisateur"
+    sessions_text, competitions_text = compact_sessions(seances), compact_competitions(comps)
+    load_summary = format_load_summary(load)
+
+    base_tokens = count_tokens(render_weekly_prompt(first_name, profile_tag, sessions_text, competitions_text, intense_count, "", load_summary))
+    chunks = select_rag_chunks(rag_results, max(0, budget_tokens - base_tokens))
+    rag_context = format_rag_context(chunks)
+    prompt = render_weekly_prompt(first_name, profile_tag, sessions_text, competitions_text, intense_count, rag_context, load_summary)
+
+    raw_prompt = render_weekly_prompt(first_name, profile_tag, json.dumps(seances, default=str),
+                                      json.dumps(comps, default=str), intense_count, format_rag_context(rag_results), load_summary)
+    tokens, raw_tokens = count_tokens(prompt), count_tokens(raw_prompt)
+    report = {
+        "tokens": tokens,
+        "tokens_bruts": raw_tokens,
+        "tokens_economises": raw_tokens - tokens,
+        "extraits_retenus": len(chunks),
+        "extraits_trouves": len(rag_results),
+        "comptage_exact": exact_token_count(),
+    }
+    return prompt, rag_context, report
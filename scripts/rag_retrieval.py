@@ -0,0 +1,86 @@
+import numpy as np
+from training_load import ACWR_HIGH
+
+# Recherche RAG multi-requêtes : une requête thématique par besoin détecté dans la semaine
+# (compétition, séances longues, bloc intense...), embeddings calculés en un seul appel,
+# un seul aller-retour de recherche, puis fusion des résultats avec dédoublonnage et
+# classement MMR (pertinence vs redondance) dans un budget de `match_count` extraits.
+
+BASE_QUERY = "Modèle méditerranéen, Oméga 3, équilibre acido-basique, charge glucidique compétition"
+MAX_RAG_QUERIES = 4
+MMR_LAMBDA = 0.7          # 1 = pertinence seule, 0 = diversité seule
+LONG_SESSION_MINUTES = 90
+INTENSE_BLOCK_SESSIONS = 3
+
+# Thème -> (texte de la requête, filtre horizon ; None = toutes les fiches)
+THEMED_QUERIES = {
+    "competition": ("Protocole nutritionnel de compétition : charge glucidique J-6 à J-3, repas de la veille et du jour J", None),
+    "hydratation": ("Hydratation et boisson glucidique pendant un effort long de plus d'une heure, sodium", None),
+    "recuperation": ("Récupération après des séances intenses : fenêtre post-effort, protéines, anti-inflammatoire", None),
+    "musculation": ("Apport en protéines et acides aminés pour la musculation et la synthèse musculaire", None),
+}
+
+def build_rag_queries(seances, comps, load=None):
+    """Requêtes de la semaine : la requête générale (horizon 'week') puis les thèmes déclenchés."""
+    queries = [{"theme": "general", "texte": BASE_QUERY, "horizon": "week"}]
+    intense = load["seances_intenses"] if load else sum(1 for s in seances if (s.get("intensité") or 0) >= 2)
+    ratio = (load or {}).get("ratio_aigu_chronique")
+    sports = {str(s.get("sport") or "").lower() for s in seances}
+
+    triggered = []
+    if comps:
+        triggered.append("competition")
+    if any((s.get("durée") or 0) >= LONG_SESSION_MINUTES for s in seances):
+        triggered.append("hydratation")
+    if intense >= INTENSE_BLOCK_SESSIONS or (ratio is not None and ratio > ACWR_HIGH):
+        triggered.append("recuperation")
+    if "musculation" in sports:
+        triggered.append("musculation")
+
+    for theme in triggered[:MAX_RAG_QUERIES - 1]:
+        text, horizon = THEMED_QUERIES[theme]
+        queries.append({"theme": theme, "texte": text, "horizon": horizon})
+    return queries
+
+def merge_candidates(rows, queries):
+    """Fusionne les résultats de toutes les requêtes : une entrée par fiche (id puis contenu), meilleure similarité."""
+    by_id = {}
+    for row in rows:
+        current = by_id.get(row["id"])
+        if current is None or row["similarity"] > current["similarity"]:
+            by_id[row["id"]] = {**row, "theme": queries[row["query_index"]]["theme"]}
+    by_content = {}
+    for row in sorted(by_id.values(), key=lambda r: (-r["similarity"], r["id"])):
+        by_content.setdefault(row["content"].strip(), row)
+    return list(by_content.values())
+
+def mmr_select(candidates, match_count, mmr_lambda=MMR_LAMBDA):
+    """Maximal Marginal Relevance : à chaque étape, la fiche maximisant
+    λ·similarité(requête) − (1−λ)·max similarité(fiches déjà retenues).
+
+    Les similarités entre fiches viennent de `redundancy` (calculé par la recherche) ; sans
+    elles (RPC sans `include_redundancy`), classement par similarité seule.
+    """
+    if not candidates or match_count <= 0:
+        return []
+    if any(c.get("redundancy") is None for c in candidates):
+        return sorted(candidates, key=lambda c: -c["similarity"])[:match_count]
+
+    pairwise = np.asarray([[1.0 if a is b else a["redundancy"].get(str(b["id"]), 0.0) for b in candidates]
+                           for a in candidates])
+    relevance = np.asarray([c["similarity"] for c in candidates])
+    redundancy = np.zeros(len(candidates))
+    available = np.ones(len(candidates), dtype=bool)
+    selected = []
+    for _ in range(min(match_count, len(candidates))):
+        scores = np.where(available, mmr_lambda * relevance - (1 - mmr_lambda) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, pairwise[best])
+    return [candidates[i] for i in selected]
+
+def rank_rag_results(rows, queries, match_count):
+    """Lignes brutes de `match_many` / `match_nutrition_multi` -> extraits classés, sans les similarités entre fiches."""
+    ranked = mmr_select(merge_candidates(rows, queries), match_count)
+    return [{k: v for k, v in row.items() if k not in ("redundancy", "query_index")} for row in ranked]
@@ -0,0 +1,45 @@
+import os
+import pytest
+import vector_index
+from vector_index import NutritionIndex, _synthetic_rows, verify_parity
+
+# Parité de l'index local avec la transcription SQL de match_nutrition (python -m pytest scripts)
+
+# Écart de similarité toléré par précision : la quantification arrondit les vecteurs
+TOLERANCES = {"float32": 1e-4, "float16": 1e-3, "int8": 1e-2}
+
+@pytest.fixture(scope="module")
+def rows():
+    return _synthetic_rows()
+
+@pytest.fixture(scope="module")
+def index(rows):
+    return NutritionIndex.from_rows(rows)
+
+def test_parity_with_match_nutrition(index, rows):
+    assert verify_parity(index, rows=rows) == []
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_quantized_parity_with_match_nutrition(index, rows, precision, monkeypatch):
+    monkeypatch.setattr(vector_index, "SCORE_BLOCK_ROWS", 16)  # Plusieurs blocs de conversion float32
+    quantized = index.quantized(precision)
+    assert quantized.precision == precision
+    assert verify_parity(quantized, rows=rows, tolerance=TOLERANCES[precision]) == []
+
+def test_quantized_index_is_smaller(index):
+    assert index.quantized("float16").nbytes() == index.nbytes() // 2
+    assert index.quantized("int8").nbytes() < index.nbytes() // 3
+
+def test_shared_index_reloads_rebuilt_snapshot(rows, tmp_path):
+    path = str(tmp_path / "nutrition_index")
+    NutritionIndex.from_rows(rows[:100]).save(path)
+    vector_index.reset_shared_index()
+    try:
+        first = vector_index.get_shared_index(None, path)
+        assert len(first) == 100 and vector_index.get_shared_index(None, path) is first
+        NutritionIndex.from_rows(rows).save(path)
+        stat = (tmp_path / "nutrition_index.npy").stat()
+        os.utime(tmp_path / "nutrition_index.npy", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        assert len(vector_index.get_shared_index(None, path)) == len(rows)
+    finally:
+        vector_index.reset_shared_index()
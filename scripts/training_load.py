@@ -0,0 +1,204 @@
+import sys
+from datetime import date, timedelta
+import numpy as np
+from user_context import CHRONIC_WEEKS, IN_FILTER_SIZE, _fetch_all
+
+# Analyse de charge d'entraînement pour toute la base en une passe NumPy : les séances
+# sont chargées en colonnes (utilisateur, jour, durée, intensité, sport) et agrégées par
+# utilisateur avec np.bincount, sans boucle Python par utilisateur.
+#
+# Fenêtres (jours relatifs à aujourd'hui = J) :
+# - semaine planifiée J à J+6 : charge aiguë, celle que couvre la stratégie hebdo ;
+# - historique J-28 à J-1 : charge chronique (moyenne hebdomadaire sur 4 semaines), ratio
+#   aigu:chronique seulement si au moins MIN_CHRONIC_WEEKS de ces semaines ont une séance ;
+# - compétitions J à J+10 : jours avant la prochaine compétition.
+
+COMPETITION_HORIZON_DAYS = 10
+INTENSE_THRESHOLD = 2        # Intensité 2-3 = séance intense (même règle que l'alerte du prompt)
+DEFAULT_INTENSITY = 1        # Intensité non renseignée
+HIGH_VOLUME_MINUTES = 600    # Plus de 10h par semaine : profil haut niveau
+ACWR_HIGH = 1.5              # Ratio aigu:chronique au-delà duquel le risque de blessure augmente
+MIN_CHRONIC_WEEKS = 3        # Semaines d'historique avec séance requises pour le ratio (sinon il n'a pas de sens)
+
+class SessionColumns:
+    """Séances en tableaux parallèles ; `user` est l'index de l'utilisateur dans `user_ids`."""
+
+    def __init__(self, user_ids, user, day, duration, intensity, sport, sports):
+        self.user_ids = list(user_ids)
+        self.user = user
+        self.day = day
+        self.duration = duration
+        self.intensity = intensity
+        self.sport = sport
+        self.sports = list(sports)
+
+    def __len__(self):
+        return len(self.user)
+
+    @classmethod
+    def from_rows(cls, rows, user_ids, today=None):
+        """Convertit des lignes PostgREST ; les utilisateurs absents de `user_ids` sont ajoutés à la fin."""
+        today = np.datetime64(today or date.today(), "D")
+        rows = [r for r in rows if r.get("date")]
+        user_ids = list(dict.fromkeys(list(user_ids) + [r["id_utilisateur"] for r in rows]))
+        position = {u: i for i, u in enumerate(user_ids)}
+        user = np.fromiter((position[r["id_utilisateur"]] for r in rows), dtype=np.int32, count=len(rows))
+        days = np.array([str(r["date"])[:10] for r in rows], dtype="datetime64[D]")
+        day = (days - today).astype(np.int32)
+        duration = np.array([r.get("durée") or 0 for r in rows], dtype=np.float32)
+        intensity = np.array([r.get("intensité") or DEFAULT_INTENSITY for r in rows], dtype=np.float32)
+        sports, sport = np.unique(np.array([str(r.get("sport") or "").lower() for r in rows], dtype=object).astype(str),
+                                  return_inverse=True)
+        return cls(user_ids, user, day, duration, intensity, sport.astype(np.int32), sports.tolist())
+
+class LoadMetrics:
+    """Indicateurs par utilisateur, un tableau NumPy par indicateur (même ordre que `user_ids`)."""
+
+    FIELDS = ("seances_semaine", "volume_semaine_min", "charge_semaine", "seances_intenses",
+              "charge_chronique", "ratio_aigu_chronique", "jours_avant_competition", "sport_principal")
+
+    def __init__(self, user_ids, sports, **arrays):
+        self.user_ids = list(user_ids)
+        self.sports = list(sports)
+        self._position = {u: i for i, u in enumerate(self.user_ids)}
+        for field in self.FIELDS:
+            setattr(self, field, arrays[field])
+
+    def for_user(self, user_id):
+        """Indicateurs d'un utilisateur en types Python (None : non calculable)."""
+        i = self._position.get(user_id)
+        if i is None:
+            return None
+        values = {}
+        for field in self.FIELDS:
+            value = getattr(self, field)[i]
+            if field == "sport_principal":
+                values[field] = self.sports[value] if value >= 0 else None
+            elif isinstance(value, np.floating):
+                values[field] = None if np.isnan(value) else round(float(value), 2)
+            else:
+                values[field] = None if value < 0 else int(value)
+        return values
+
+def compute_load_metrics(sessions, competition_user, competition_day):
+    """Une passe vectorisée sur toutes les séances (voir les fenêtres en tête de module).
+
+    `competition_user` / `competition_day` : indices utilisateur (dans `sessions.user_ids`) et jours
+    relatifs des compétitions.
+    """
+    n = len(sessions.user_ids)
+    load = sessions.duration * sessions.intensity  # Charge = durée x intensité (méthode sRPE simplifiée)
+
+    week = (sessions.day >= 0) & (sessions.day <= 6)
+    history = (sessions.day < 0) & (sessions.day >= -7 * CHRONIC_WEEKS)
+    intense = week & (sessions.intensity >= INTENSE_THRESHOLD)
+
+    def per_user(mask, weights=None):
+        return np.bincount(sessions.user[mask], weights=None if weights is None else weights[mask], minlength=n)
+
+    charge_semaine = per_user(week, load)
+    charge_chronique = per_user(history, load) / CHRONIC_WEEKS
+    # Semaines d'historique (0 = J-7 à J-1, ... 3 = J-28 à J-22) avec au moins une séance, par utilisateur
+    history_week = (-sessions.day[history] - 1) // 7
+    logged = np.unique(sessions.user[history].astype(np.int64) * CHRONIC_WEEKS + history_week)
+    weeks_logged = np.bincount(logged // CHRONIC_WEEKS, minlength=n)
+    ratio = np.full(n, np.nan)
+    np.divide(charge_semaine, charge_chronique, out=ratio,
+              where=(charge_chronique > 0) & (weeks_logged >= MIN_CHRONIC_WEEKS))
+
+    upcoming = (competition_day >= 0) & (competition_day <= COMPETITION_HORIZON_DAYS)
+    next_competition = np.full(n, np.iinfo(np.int32).max, dtype=np.int64)
+    np.minimum.at(next_competition, competition_user[upcoming], competition_day[upcoming])
+    next_competition[next_competition == np.iinfo(np.int32).max] = -1  # Aucune compétition
+
+    # Sport principal de la semaine : charge par (utilisateur, sport) en une seule bincount
+    n_sports = max(1, len(sessions.sports))
+    by_sport = np.bincount(sessions.user[week] * n_sports + sessions.sport[week], weights=load[week],
+                           minlength=n * n_sports).reshape(n, n_sports)
+    main_sport = np.where(by_sport.max(axis=1, initial=0) > 0, by_sport.argmax(axis=1), -1)
+
+    return LoadMetrics(
+        sessions.user_ids,
+        sessions.sports,
+        seances_semaine=per_user(week).astype(np.int64),
+        volume_semaine_min=per_user(week, sessions.duration),
+        charge_semaine=charge_semaine,
+        seances_intenses=per_user(intense).astype(np.int64),
+        charge_chronique=charge_chronique,
+        ratio_aigu_chronique=ratio,
+        jours_avant_competition=next_competition,
+        sport_principal=main_sport,
+    )
+
+def _fetch_window(supabase, table, columns, user_ids, start, end):
+    """Lignes de `table` avec start <= date < end (`end` exclusif : `date` est un timestamp)."""
+    def make_query(chunk=None):
+        query = supabase.table(table).select(columns).gte("date", start).lt("date", end)
+        return (query.in_("id_utilisateur", chunk) if chunk is not None else query).order("id")
+    if user_ids is None:
+        return _fetch_all(make_query)
+    rows = []
+    for i in range(0, len(user_ids), IN_FILTER_SIZE):
+        chunk = user_ids[i:i + IN_FILTER_SIZE]
+        rows.extend(_fetch_all(lambda: make_query(chunk)))
+    return rows
+
+def load_training_metrics(supabase, user_ids=None, today=None):
+    """Charge les séances (J-28 à J+6) et compétitions (J à J+10) de `user_ids` (None = toute la base)
+    en ne sélectionnant que les colonnes utiles, puis calcule les indicateurs.
+    """
+    today = today or date.today()
+    user_ids = list(dict.fromkeys(user_ids)) if user_ids is not None else None
+    seances = _fetch_window(supabase, "seance", "id_utilisateur, date, durée, intensité, sport", user_ids,
+                            (today - timedelta(days=7 * CHRONIC_WEEKS)).isoformat(), (today + timedelta(days=7)).isoformat())
+    competitions = _fetch_window(supabase, "competition", "id_utilisateur, date", user_ids,
+                                 today.isoformat(), (today + timedelta(days=COMPETITION_HORIZON_DAYS + 1)).isoformat())
+    return metrics_from_rows(seances, competitions, user_ids or [], today)
+
+def metrics_from_rows(seances, competitions, user_ids, today=None):
+    """Indicateurs à partir de lignes déjà chargées (séances J-28 à J+6, compétitions J à J+10),
+    par exemple celles du contexte de user_context : aucune requête supplémentaire.
+    """
+    today = today or date.today()
+    competitions = [c for c in competitions if c.get("date")]
+    sessions = SessionColumns.from_rows(seances, user_ids, today)
+    position = {u: i for i, u in enumerate(sessions.user_ids)}
+    # Utilisateurs n'ayant qu'une compétition : ajoutés pour que leurs indices existent
+    for competition in competitions:
+        if competition["id_utilisateur"] not in position:
+            position[competition["id_utilisateur"]] = len(sessions.user_ids)
+            sessions.user_ids.append(competition["id_utilisateur"])
+    competition_user = np.fromiter((position[c["id_utilisateur"]] for c in competitions), dtype=np.int64, count=len(competitions))
+    competition_day = (np.array([str(c["date"])[:10] for c in competitions], dtype="datetime64[D]")
+                       - np.datetime64(today, "D")).astype(np.int64)
+    return compute_load_metrics(sessions, competition_user, competition_day)
+
+def format_load_summary(load):
+    """Ligne du prompt décrivant la charge de la semaine."""
+    if not load:
+        return "non disponible"
+    ratio = load["ratio_aigu_chronique"]
+    if ratio is None:
+        ratio_text = "n/a (historique insuffisant)"
+    else:
+        ratio_text = f"{ratio:.2f}" + (" (hausse brutale, risque de blessure)" if ratio > ACWR_HIGH else "")
+    competition = load["jours_avant_competition"]
+    sport = f" (surtout {load['sport_principal']})" if load["sport_principal"] else ""
+    return (f"{load['volume_semaine_min']:.0f} min sur {load['seances_semaine']} séances{sport}, "
+            f"charge {load['charge_semaine']:.0f} (durée x intensité), ratio aigu:chronique {ratio_text}, "
+            f"prochaine compétition : {f'J+{competition}' if competition is not None else 'aucune sous 10 jours'}")
+
+if __name__ == "__main__":
+    from clients import ConfigurationError, get_supabase, load_config
+    try:
+        load_config()
+    except ConfigurationError as e:
+        print(f"❌ {e}")
+        exit(1)
+    metrics = load_training_metrics(get_supabase(), sys.argv[1:] or None)
+    ratio = metrics.ratio_aigu_chronique
+    print(f"--- CHARGE D'ENTRAÎNEMENT ({len(metrics.user_ids)} utilisateurs) ---")
+    print(f"Volume hebdo médian : {np.median(metrics.volume_semaine_min) if metrics.user_ids else 0:.0f} min")
+    print(f"Plus de {HIGH_VOLUME_MINUTES // 60}h planifiées : {int(np.sum(metrics.volume_semaine_min >= HIGH_VOLUME_MINUTES))}")
+    print(f"Ratio aigu:chronique > {ACWR_HIGH} : {int(np.sum(np.nan_to_num(ratio) > ACWR_HIGH))}")
+    print(f"Compétition sous {COMPETITION_HORIZON_DAYS} jours : {int(np.sum(metrics.jours_avant_competition >= 0))}")
@@ -0,0 +1,163 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from instrumentation import record_retry
+from worker_pool import throttle
+
+IN_FILTER_SIZE = 200  # Identifiants par filtre in_ (longueur d'URL PostgREST)
+PAGE_SIZE = 1000      # Limite de lignes par réponse PostgREST
+CHRONIC_WEEKS = 4     # Historique de séances chargé avec le contexte (charge chronique, training_load)
+CHUNK_RETRIES = 2     # Nouvelles tentatives d'un paquet avant le repli utilisateur par utilisateur
+RETRY_DELAY_SECONDS = 0.5
+QUERIES_PER_USER = 4  # Requêtes parallèles de load_user_context
+DEFAULT_CONCURRENCY = 8
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def configure_context_pool(concurrency):
+    """Dimensionne le pool de requêtes pour `concurrency` utilisateurs chargés en même temps
+    (QUERIES_PER_USER threads chacun) : à appeler avec la concurrence du run ou du worker."""
+    global _executor
+    with _executor_lock:
+        previous, _executor = _executor, ThreadPoolExecutor(max_workers=max(1, concurrency) * QUERIES_PER_USER)
+    if previous is not None:
+        previous.shutdown(wait=False)
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DEFAULT_CONCURRENCY * QUERIES_PER_USER)
+        return _executor
+
+def week_bounds():
+    """Bornes utilisées par la stratégie hebdo : séances J-28 à J+6 (historique pour la charge chronique,
+    puis semaine planifiée), compétitions J à J+10, conseils du jour.
+
+    Les colonnes `date` sont des timestamps : les fins de fenêtre sont exclusives (lendemain du
+    dernier jour, à minuit), sinon `lte('date', J+6)` exclurait une séance à 18:00 ce jour-là.
+    """
+    today = datetime.now().date()
+    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return {
+        "history_start": (today - timedelta(days=7 * CHRONIC_WEEKS)).isoformat(),
+        "today": today.isoformat(),
+        "week_end": (today + timedelta(days=7)).isoformat(),
+        "horizon_end": (today + timedelta(days=11)).isoformat(),
+        "today_start": today_start.isoformat(),
+        "today_end": (today_start + timedelta(days=1)).isoformat(),
+    }
+
+def _execute(query):
+    throttle("supabase")
+    return query.execute().data
+
+def _fetch_all(make_query):
+    """Exécute une requête par pages de PAGE_SIZE lignes (les réponses PostgREST sont plafonnées)."""
+    rows = []
+    start = 0
+    while True:
+        page = _execute(make_query().range(start, start + PAGE_SIZE - 1))
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+def _split_sessions(seances, b):
+    """Séances J-28 à J+6 -> (semaine planifiée J à J+6, historique J-28 à J-1)."""
+    week, history = [], []
+    for seance in seances:
+        (week if str(seance.get("date") or "")[:10] >= b["today"] else history).append(seance)
+    return week, history
+
+def _advice_state(advices):
+    """Un conseil 'en_cours' est la trace d'une génération en streaming interrompue : il sera repris, pas ignoré."""
+    interrupted = [a["id"] for a in advices if a.get("statut") == "en_cours"]
+    return {
+        "advice_exists": any(a.get("statut") != "en_cours" for a in advices),
+        "interrupted_advice_id": interrupted[0] if interrupted else None,
+    }
+
+# --- UN UTILISATEUR ---
+
+def load_user_context(supabase, user_id):
+    """Charge profil, séances (J-28 à J+6, en une requête), compétitions et existence du conseil du jour en parallèle.
+
+    Profil None s'il n'existe pas ; une requête en échec lève son exception, pour que
+    l'utilisateur soit compté en erreur et retenté plutôt qu'ignoré.
+    """
+    b = week_bounds()
+    executor = _pool()
+    futures = {
+        "profile": executor.submit(_execute, supabase.table("profil_utilisateur").select("*").eq("id", user_id).limit(1)),
+        "seances": executor.submit(_execute, supabase.table("seance").select("*").eq("id_utilisateur", user_id)
+                                .gte("date", b["history_start"]).lt("date", b["week_end"])),
+        "competitions": executor.submit(_execute, supabase.table("competition").select("*").eq("id_utilisateur", user_id)
+                                     .gte("date", b["today"]).lt("date", b["horizon_end"])),
+        "advice": executor.submit(_execute, supabase.table("conseil_semaine").select("id, statut").eq("id_utilisateur", user_id)
+                               .gte("date_creation", b["today_start"]).lt("date_creation", b["today_end"])),
+    }
+
+    context = _advice_state(futures["advice"].result())
+    profiles = futures["profile"].result()
+    context["profile"] = profiles[0] if profiles else None
+    context["seances"], context["historique"] = _split_sessions(futures["seances"].result(), b)
+    context["competitions"] = futures["competitions"].result()
+    return context
+
+# --- PLUSIEURS UTILISATEURS ---
+
+def _load_chunk(supabase, user_ids, b):
+    profiles = _fetch_all(lambda: supabase.table("profil_utilisateur").select("*").in_("id", user_ids).order("id"))
+    seances = _fetch_all(lambda: supabase.table("seance").select("*").in_("id_utilisateur", user_ids)
+                         .gte("date", b["history_start"]).lt("date", b["week_end"]).order("id"))
+    competitions = _fetch_all(lambda: supabase.table("competition").select("*").in_("id_utilisateur", user_ids)
+                              .gte("date", b["today"]).lt("date", b["horizon_end"]).order("id"))
+    advices = _fetch_all(lambda: supabase.table("conseil_semaine").select("id, id_utilisateur, statut").in_("id_utilisateur", user_ids)
+                         .gte("date_creation", b["today_start"]).lt("date_creation", b["today_end"]).order("id"))
+
+    contexts = {u: {"profile": None, "seances": [], "historique": [], "competitions": []} for u in user_ids}
+    for profile in profiles:
+        contexts[profile["id"]]["profile"] = profile
+    week, history = _split_sessions(seances, b)
+    for key, rows in (("seances", week), ("historique", history)):
+        for seance in rows:
+            contexts[seance["id_utilisateur"]][key].append(seance)
+    for competition in competitions:
+        contexts[competition["id_utilisateur"]]["competitions"].append(competition)
+    advices_by_user = {u: [] for u in user_ids}
+    for advice in advices:
+        advices_by_user[advice["id_utilisateur"]].append(advice)
+    for user_id, user_advices in advices_by_user.items():
+        contexts[user_id].update(_advice_state(user_advices))
+    return contexts
+
+def _load_chunk_with_retries(supabase, user_ids, b):
+    """`_load_chunk` avec CHUNK_RETRIES nouvelles tentatives ; {} si le paquet échoue toujours."""
+    for attempt in range(CHUNK_RETRIES + 1):
+        if attempt:
+            record_retry("contexte_lot")
+            time.sleep(RETRY_DELAY_SECONDS * attempt)
+        try:
+            return _load_chunk(supabase, user_ids, b)
+        except Exception as e:
+            error = e
+    print(f"⚠️ Contexte de {len(user_ids)} utilisateurs non préchargé ({error}) : chargement individuel.")
+    return {}
+
+def load_users_context(supabase, user_ids):
+    """Charge le contexte de plusieurs utilisateurs : 4 requêtes filtrées par `in_` par paquet de IN_FILTER_SIZE.
+
+    Retourne {user_id: {"profile", "seances", "historique", "competitions", "advice_exists", "interrupted_advice_id"}}.
+    Les utilisateurs d'un paquet en échec malgré les tentatives sont absents du résultat : leur
+    contexte sera chargé par `load_user_context`.
+    """
+    b = week_bounds()
+    user_ids = list(dict.fromkeys(user_ids))
+    chunks = [user_ids[i:i + IN_FILTER_SIZE] for i in range(0, len(user_ids), IN_FILTER_SIZE)]
+    contexts = {}
+    for chunk_contexts in _pool().map(lambda chunk: _load_chunk_with_retries(supabase, chunk, b), chunks):
+        contexts.update(chunk_contexts)
+    return contexts
@@ -0,0 +1,412 @@
+import os
+import sys
+import copy
+import json
+import threading
+import numpy as np
+
+# --- CONFIGURATION ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(project_root, ".cache", "nutrition_index")
+PRECISIONS = ("float32", "float16", "int8")
+SCORE_BLOCK_ROWS = 256  # float16/int8 : lignes converties en float32 à la fois (le tampon reste en cache L2)
+
+def _parse_embedding(value):
+    """PostgREST renvoie les colonnes pgvector sous forme de texte '[0.1,...]'."""
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+class NutritionIndex:
+    """Index vectoriel en mémoire équivalent à la fonction SQL `match_nutrition`.
+
+    Les embeddings sont rangés dans une matrice float32 contiguë (lignes normalisées,
+    éventuellement memory-mappée depuis un snapshot) et les filtres profil/horizon
+    sont précalculés en masques booléens. `quantized` en fait une copie float16 ou int8.
+    """
+
+    precision = "float32"
+    scales = None  # int8 : facteur de chaque ligne (valeur = code x échelle)
+
+    def __init__(self, ids, contents, metadatas, matrix, normalized=False):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.contents = list(contents)
+        self.metadatas = list(metadatas)
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if matrix.ndim != 2:
+            matrix = matrix.reshape(len(self.ids), -1)
+        if normalized:
+            self.matrix = matrix
+            self.valid = np.any(matrix != 0, axis=1)
+        else:
+            norms = np.linalg.norm(matrix, axis=1)
+            self.valid = norms > 0
+            self.matrix = np.divide(matrix, norms[:, None], out=np.zeros_like(matrix), where=self.valid[:, None])
+        self._profil_masks = self._build_masks("profil")
+        self._horizon_masks = self._build_masks("horizon")
+
+    def _build_masks(self, field):
+        masks = {}
+        for i, meta in enumerate(self.metadatas):
+            value = (meta or {}).get(field)
+            if value is None:
+                continue
+            mask = masks.setdefault(str(value), np.zeros(len(self.ids), dtype=bool))
+            mask[i] = True
+        return masks
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dimensions(self):
+        return self.matrix.shape[1]
+
+    # --- QUANTIFICATION ---
+
+    def quantized(self, precision):
+        """Copie de l'index dont la matrice est stockée en `precision` (métadonnées et masques partagés).
+
+        float16 : 2 octets par dimension ; int8 : 1 octet par dimension + une échelle float32 par
+        ligne (quantification symétrique sur le maximum absolu de la ligne).
+
+        Ce sont des options mémoire : int8 garde une recherche aussi rapide que float32 (4x moins
+        d'octets lus compensent la conversion), float16 est nettement plus lent car la conversion
+        float16 -> float32 de NumPy n'est pas vectorisée.
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"Précision inconnue : {precision} (attendu : {', '.join(PRECISIONS)})")
+        matrix = self.dequantize(np.arange(len(self.ids)))
+        index = copy.copy(self)
+        index.precision, index.scales = precision, None
+        if precision == "float32":
+            index.matrix = matrix
+        elif precision == "float16":
+            index.matrix = matrix.astype(np.float16)
+        else:
+            scales = np.abs(matrix).max(axis=1) / 127
+            scales[scales == 0] = 1.0
+            index.matrix = np.round(matrix / scales[:, None]).astype(np.int8)
+            index.scales = scales.astype(np.float32)
+        return index
+
+    def dequantize(self, rows):
+        """Lignes `rows` de la matrice en float32."""
+        matrix = np.asarray(self.matrix[rows], dtype=np.float32)
+        if self.scales is not None:
+            matrix = matrix * self.scales[rows][:, None]
+        return matrix
+
+    def nbytes(self):
+        return self.matrix.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def _scores(self, rows, queries):
+        """Similarités cosinus des lignes `rows` avec des requêtes normalisées (vecteur ou matrice en colonnes)."""
+        queries = queries.astype(np.float32)
+        full = len(rows) * 2 >= len(self.ids)  # Filtre peu sélectif : toute la matrice plutôt qu'une copie des lignes
+        if self.matrix.dtype != np.float32:
+            scores = self._block_scores(rows, queries, full)
+        elif full:
+            scores = (self.matrix @ queries)[rows]
+        else:
+            scores = self.matrix[rows] @ queries
+        if self.scales is not None:
+            scores = scores * self.scales[rows].reshape(-1, *([1] * (scores.ndim - 1)))
+        return np.asarray(scores, dtype=np.float64)
+
+    def _block_scores(self, rows, queries, full):
+        """float16/int8 : NumPy n'a pas de produit BLAS sur ces types. Les lignes sont converties par blocs
+        de SCORE_BLOCK_ROWS dans un tampon float32 réutilisé, sans copie float32 de toutes les candidates.
+        """
+        count = len(self.ids) if full else len(rows)
+        buffer = np.empty((min(SCORE_BLOCK_ROWS, count), self.dimensions), dtype=np.float32)
+        scores = np.empty((count,) + queries.shape[1:], dtype=np.float32)
+        for start in range(0, count, SCORE_BLOCK_ROWS):
+            stop = min(start + SCORE_BLOCK_ROWS, count)
+            block = self.matrix[start:stop] if full else self.matrix[rows[start:stop]]
+            np.copyto(buffer[:stop - start], block, casting="unsafe")
+            scores[start:stop] = buffer[:stop - start] @ queries
+        return scores[rows] if full else scores
+
+    # --- CONSTRUCTION ---
+
+    @classmethod
+    def from_rows(cls, rows):
+        rows = [r for r in rows if r.get("embedding") is not None]
+        vectors = [_parse_embedding(r["embedding"]) for r in rows]
+        dim = len(vectors[0]) if vectors else 0
+        return cls(
+            ids=[r["id"] for r in rows],
+            contents=[r["content"] for r in rows],
+            metadatas=[r.get("metadata") or {} for r in rows],
+            matrix=np.asarray(vectors, dtype=np.float32).reshape(len(rows), dim),
+        )
+
+    @classmethod
+    def from_supabase(cls, supabase, page_size=1000):
+        """Charge toute la table `nutrition` (pagination)."""
+        rows = []
+        start = 0
+        while True:
+            page = supabase.table("nutrition").select("id, content, embedding, metadata").order("id").range(start, start + page_size - 1).execute().data
+            rows.extend(page)
+            if len(page) < page_size:
+                return cls.from_rows(rows)
+            start += page_size
+
+    def save(self, path=DEFAULT_SNAPSHOT_PATH):
+        """Écrit le snapshot : `path.npy` (matrice normalisée, float32) + `path.json` (ids, contenus, métadonnées).
+
+        Chaque fichier est écrit à côté puis renommé, le `.npy` en dernier : un processus qui voit
+        le nouveau `.npy` (voir `get_shared_index`) trouve déjà le `.json` correspondant.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".json.tmp", "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids.tolist(), "contents": self.contents, "metadatas": self.metadatas}, f, ensure_ascii=False)
+        os.replace(path + ".json.tmp", path + ".json")
+        with open(path + ".npy.tmp", "wb") as f:
+            np.save(f, self.dequantize(np.arange(len(self.ids))))
+        os.replace(path + ".npy.tmp", path + ".npy")
+
+    @classmethod
+    def load(cls, path=DEFAULT_SNAPSHOT_PATH, mmap=True):
+        """Recharge un snapshot ; avec `mmap`, la matrice est partagée via le cache de pages de l'OS."""
+        with open(path + ".json", encoding="utf-8") as f:
+            sidecar = json.load(f)
+        matrix = np.load(path + ".npy", mmap_mode="r" if mmap else None)
+        return cls(sidecar["ids"], sidecar["contents"], sidecar["metadatas"], matrix, normalized=True)
+
+    # --- RECHERCHE ---
+
+    def candidate_mask(self, filter_profil, filter_horizon=None):
+        """Lignes autorisées par les filtres de `match_nutrition` (profil 'tous' ou exact, horizon exact ou NULL)."""
+        empty = np.zeros(len(self.ids), dtype=bool)
+        mask = self._profil_masks.get("tous", empty).copy()
+        if filter_profil is not None:
+            mask |= self._profil_masks.get(filter_profil, empty)
+        if filter_horizon is not None:
+            mask &= self._horizon_masks.get(filter_horizon, empty)
+        return mask & self.valid
+
+    def match(self, query_embedding, match_threshold, match_count, filter_profil, filter_horizon=None):
+        """Même contrat que l'RPC : liste de {id, content, similarity, metadata} triée par similarité décroissante."""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0 or match_count <= 0:
+            return []  # Distance cosinus NaN côté pgvector : aucune ligne ne passe le seuil
+        candidates = np.flatnonzero(self.candidate_mask(filter_profil, filter_horizon))
+        if candidates.size == 0:
+            return []
+        similarities = self._scores(candidates, query / norm)
+        keep = similarities > match_threshold
+        candidates, similarities = candidates[keep], similarities[keep]
+        order = np.lexsort((self.ids[candidates], -similarities))[:match_count]
+        return [
+            {
+                "id": int(self.ids[candidates[i]]),
+                "content": self.contents[candidates[i]],
+                "similarity": float(similarities[i]),
+                "metadata": self.metadatas[candidates[i]],
+            }
+            for i in order
+        ]
+
+    def match_many(self, queries, match_threshold, match_count, filter_profil, include_redundancy=False):
+        """Équivalent local de `match_nutrition_multi` : `queries` = [{"embedding", "horizon"}].
+
+        Un seul produit matrice x requêtes pour toutes les requêtes ; retourne les lignes de chaque
+        requête (au plus `match_count`, avec `query_index`), comme la fonction SQL. Avec
+        `include_redundancy`, chaque ligne porte `redundancy` : {id (texte): similarité} avec les
+        autres fiches retenues, arrondie comme côté SQL.
+        """
+        if not queries or match_count <= 0:
+            return []
+        base = self.candidate_mask(filter_profil)
+        candidates = np.flatnonzero(base)
+        matrix = np.asarray([q["embedding"] for q in queries], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1)
+        matrix = np.divide(matrix, norms[:, None], out=np.zeros_like(matrix), where=norms[:, None] > 0)
+        similarities = self._scores(candidates, matrix.T)  # (candidats, requêtes)
+
+        rows, positions = [], []
+        for q, query in enumerate(queries):
+            if norms[q] == 0:
+                continue
+            keep = similarities[:, q] > match_threshold
+            horizon = query.get("horizon")
+            if horizon is not None:
+                keep &= self._horizon_masks.get(horizon, np.zeros(len(self.ids), dtype=bool))[candidates]
+            selected, scores = candidates[keep], similarities[keep, q]
+            for i in np.lexsort((self.ids[selected], -scores))[:match_count]:
+                rows.append({
+                    "query_index": q,
+                    "id": int(self.ids[selected[i]]),
+                    "content": self.contents[selected[i]],
+                    "similarity": float(scores[i]),
+                    "metadata": self.metadatas[selected[i]],
+                })
+                positions.append(selected[i])
+        if include_redundancy and rows:
+            unique = np.unique(positions)
+            vectors = self.dequantize(unique)
+            pairwise = np.round(vectors @ vectors.T, 4)
+            slot = {p: k for k, p in enumerate(unique)}
+            keys = [str(int(self.ids[p])) for p in unique]
+            for row, position in zip(rows, positions):
+                k = slot[position]
+                row["redundancy"] = {key: float(pairwise[k, j]) for j, key in enumerate(keys) if j != k}
+        return rows
+
+_shared_index = None
+_shared_version = None  # (chemin, précision, date de modification du snapshot) de l'index chargé
+_shared_lock = threading.Lock()
+
+def _snapshot_mtime(path):
+    try:
+        return os.stat(path + ".npy").st_mtime_ns
+    except OSError:
+        return None
+
+def get_shared_index(supabase, path=DEFAULT_SNAPSHOT_PATH, precision="float32"):
+    """Index unique du processus : snapshot disque s'il existe, sinon chargement depuis Supabase.
+
+    Rechargé quand le snapshot change sur disque (reconstruit par ingest_pdf.py) : un worker
+    longue durée voit les nouvelles fiches sans redémarrer.
+    """
+    global _shared_index, _shared_version
+    with _shared_lock:
+        mtime = _snapshot_mtime(path)
+        version = (path, precision, mtime)
+        if _shared_index is None or _shared_version != version:
+            if mtime is not None:
+                index = NutritionIndex.load(path)
+            elif _shared_index is not None and _shared_version[:2] == (path, precision):
+                return _shared_index  # Chargé depuis Supabase, pas de snapshot à surveiller
+            else:
+                index = NutritionIndex.from_supabase(supabase)
+            if precision != "float32":
+                index = index.quantized(precision)
+            if _shared_index is not None:
+                print(f"🔄 Index RAG rechargé ({len(index)} fiches).")
+            _shared_index, _shared_version = index, version
+        return _shared_index
+
+def reset_shared_index():
+    """Oublie l'index partagé (rechargé au prochain `get_shared_index`)."""
+    global _shared_index, _shared_version
+    with _shared_lock:
+        _shared_index, _shared_version = None, None
+
+# --- PARITÉ AVEC match_nutrition ---
+
+def reference_match(rows, query_embedding, match_threshold, match_count, filter_profil, filter_horizon=None):
+    """Transcription ligne à ligne de la requête SQL de `match_nutrition` (référence pour la parité)."""
+    query = [float(x) for x in query_embedding]
+    query_norm = sum(x * x for x in query) ** 0.5
+    results = []
+    for row in rows:
+        meta = row.get("metadata") or {}
+        if not (meta.get("profil") == "tous" or (filter_profil is not None and meta.get("profil") == filter_profil)):
+            continue
+        if not (filter_horizon is None or meta.get("horizon") == filter_horizon):
+            continue
+        vector = _parse_embedding(row["embedding"])
+        norm = sum(x * x for x in vector) ** 0.5
+        if norm == 0 or query_norm == 0:
+            continue
+        similarity = sum(a * b for a, b in zip(vector, query)) / (norm * query_norm)
+        if similarity > match_threshold:
+            results.append({"id": row["id"], "similarity": similarity})
+    results.sort(key=lambda r: (-r["similarity"], r["id"]))
+    return results[:match_count]
+
+def _same_results(expected, actual, tolerance):
+    if len(expected) != len(actual):
+        return False
+    for e, a in zip(expected, actual):
+        if abs(e["similarity"] - a["similarity"]) > tolerance:
+            return False
+    # Les ex æquo (à `tolerance` près) peuvent être permutés : une fiche présente d'un seul côté
+    # doit avoir, de l'autre côté, une fiche de même similarité
+    expected_ids, actual_ids = {e["id"] for e in expected}, {a["id"] for a in actual}
+    swapped = [a["similarity"] for a in actual if a["id"] not in expected_ids]
+    return all(any(abs(e["similarity"] - s) <= tolerance for s in swapped)
+               for e in expected if e["id"] not in actual_ids)
+
+def parity_cases(index, n_queries=10, seed=0):
+    """Requêtes de test : lignes de l'index bruitées, croisées avec tous les filtres et seuils."""
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(index), size=min(n_queries, len(index)), replace=False)
+    profils = sorted(index._profil_masks) + ["inconnu", None]
+    horizons = sorted(index._horizon_masks) + [None]
+    for i in picks:
+        query = np.asarray(index.matrix[i], dtype=np.float64) + rng.normal(0, 0.02, index.matrix.shape[1])
+        for profil in profils:
+            for horizon in horizons:
+                for threshold in (0.0, 0.4, 0.9):
+                    yield {"query_embedding": query.tolist(), "match_threshold": threshold, "match_count": 8,
+                           "filter_profil": profil, "filter_horizon": horizon}
+
+def verify_parity(index, rows=None, supabase=None, tolerance=1e-4, n_queries=10):
+    """Compare l'index local (`match` et `match_many`) à la référence SQL (`rows`) et/ou à l'RPC distante (`supabase`).
+
+    Retourne la liste des cas en désaccord (vide si parité parfaite).
+    """
+    failures = []
+    for params in parity_cases(index, n_queries=n_queries):
+        local = index.match(**params)
+        multi = index.match_many([{"embedding": params["query_embedding"], "horizon": params["filter_horizon"]}],
+                                 params["match_threshold"], params["match_count"], params["filter_profil"])
+        if not _same_results(local, multi, tolerance):
+            failures.append(("multi", params))
+        if rows is not None and not _same_results(reference_match(rows, **params), local, tolerance):
+            failures.append(("référence", params))
+        if supabase is not None:
+            remote = supabase.rpc("match_nutrition", params).execute().data
+            if not _same_results(remote, local, tolerance):
+                failures.append(("rpc", params))
+    return failures
+
+def _synthetic_rows(n=200, dim=64, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n):
+        rows.append({
+            "id": i + 1,
+            "content": f"bloc {i}",
+            "embedding": rng.normal(size=dim).tolist() if i % 50 else [0.0] * dim,
+            "metadata": {
+                "profil": ["tous", "REM", "modere", "haut_niveau", "modere_intense"][i % 5],
+                "horizon": ["week", "jour", "seance"][i % 3],
+            } if i % 37 else {},
+        })
+    return rows
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_SNAPSHOT_PATH
+
+    if command == "verify-offline":
+        rows = _synthetic_rows()
+        failures = verify_parity(NutritionIndex.from_rows(rows), rows=rows)
+    elif command in ("snapshot", "verify"):
+        from clients import get_supabase
+        supabase = get_supabase()
+        if command == "snapshot":
+            index = NutritionIndex.from_supabase(supabase)
+            index.save(path)
+            print(f"✅ Snapshot de {len(index)} lignes écrit dans {path}.npy / .json")
+            exit(0)
+        failures = verify_parity(NutritionIndex.load(path), supabase=supabase)
+    else:
+        print("Usage: python3 vector_index.py snapshot|verify|verify-offline [CHEMIN_SNAPSHOT]")
+        exit(1)
+
+    if failures:
+        print(f"❌ {len(failures)} cas en désaccord avec match_nutrition")
+        for origin, params in failures[:5]:
+            print(f"   - {origin} : profil={params['filter_profil']} horizon={params['filter_horizon']} seuil={params['match_threshold']}")
+        exit(1)
+    print("✅ Parité avec match_nutrition vérifiée")
@@ -0,0 +1,182 @@
+import os
+import sys
+import time
+import signal
+import argparse
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import generate_weekly_strategy as weekly
+from clients import ConfigurationError, load_config, warm_up
+from embedding_cache import get_default_cache
+from instrumentation import add_profile_arguments, finish_profiling, start_profiling
+from job_queue import DEFAULT_JOB_KIND, DEFAULT_QUEUE_PATH, open_queue
+from user_context import configure_context_pool
+from worker_pool import configure_rate_limits
+
+# Worker longue durée : un seul processus garde les clients OpenAI/Supabase (connexions
+# keep-alive), le cache d'embeddings et l'index RAG chauds, et consomme la file de jobs
+# au lieu de lancer un interpréteur par utilisateur.
+
+POLL_SECONDS = 2.0
+LEASE_SECONDS = 600  # Doit couvrir une génération complète, tentatives comprises
+MAX_ATTEMPTS = 3
+SHUTDOWN_GRACE_SECONDS = 120
+
+# Type de job -> fonction(user_id) ; un résultat vide signifie « rien à faire » (statut 'ignore'),
+# un échec (lecture, sauvegarde) lève une exception et le job est retenté
+JOB_HANDLERS = {
+    "semaine": lambda user_id: weekly.generate_weekly_strategy(user_id),
+}
+
+def run_job(job):
+    handler = JOB_HANDLERS.get(job["kind"])
+    if handler is None:
+        raise ValueError(f"Type de job inconnu : {job['kind']}")
+    return handler(job["user_id"])
+
+def run_worker(queue, concurrency=8, poll_seconds=POLL_SECONDS, lease_seconds=LEASE_SECONDS,
+               max_attempts=MAX_ATTEMPTS, stop_event=None, once=False, grace_seconds=SHUTDOWN_GRACE_SECONDS):
+    """Boucle principale : réserve des jobs tant qu'il reste des places libres, jusqu'à `stop_event`.
+
+    Contre-pression : au plus `concurrency` jobs réservés à la fois ; le reste attend dans la file
+    (les limites de débit de worker_pool s'appliquent en plus à chaque appel).
+    Avec `once`, s'arrête dès que la file ne contient plus de job disponible.
+    """
+    stop_event = stop_event or threading.Event()
+    stats = {"termine": 0, "ignore": 0, "nouvelle_tentative": 0, "echec": 0, "abandonnes": 0}
+    in_flight = {}
+
+    def finish(future):
+        job, started = in_flight.pop(future)
+        elapsed = time.perf_counter() - started
+        try:
+            status = "termine" if future.result() else "ignore"
+            queue.complete(job, status)
+            stats[status] += 1
+            print(f"✅ Job {job['id']} ({job['kind']}, {job['user_id']}) : {status} en {elapsed:.1f} s")
+        except Exception as e:
+            final = queue.fail(job, str(e), max_attempts)
+            stats["echec" if final else "nouvelle_tentative"] += 1
+            suffix = "abandon" if final else f"tentative {job['attempts']}/{max_attempts}"
+            print(f"❌ Job {job['id']} ({job['user_id']}) : {e} ({suffix})")
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    while not stop_event.is_set():
+        free = concurrency - len(in_flight)
+        jobs = queue.claim(free, lease_seconds, max_attempts) if free else []
+        for job in jobs:
+            in_flight[executor.submit(run_job, job)] = (job, time.perf_counter())
+        if in_flight:
+            done, _ = wait(list(in_flight), timeout=poll_seconds, return_when=FIRST_COMPLETED)
+            for future in done:
+                finish(future)
+        elif once:
+            break
+        else:
+            stop_event.wait(poll_seconds)
+
+    if in_flight:
+        print(f"⏳ Arrêt demandé : attente de {len(in_flight)} jobs en cours (max {grace_seconds} s)...")
+        done, pending = wait(list(in_flight), timeout=grace_seconds)
+        for future in done:
+            finish(future)
+        if pending:
+            # Les jobs restants gardent leur bail : un autre worker les reprendra à expiration
+            print(f"⚠️ {len(pending)} jobs non terminés, repris après expiration du bail.")
+            stats["abandonnes"] = len(pending)
+    executor.shutdown(wait=not stats["abandonnes"], cancel_futures=True)
+    return stats
+
+def install_signal_handlers(stop_event):
+    """SIGTERM/SIGINT : arrêt propre (plus de nouvelle réservation) ; un second signal interrompt."""
+    def handler(signum, frame):
+        if stop_event.is_set():
+            raise KeyboardInterrupt
+        print(f"\n🛑 Signal {signal.Signals(signum).name} reçu : arrêt après les jobs en cours.")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, handler)
+    signal.signal(signal.SIGINT, handler)
+
+def print_counts(queue):
+    counts = queue.counts()
+    print("--- FILE DE GÉNÉRATION ---")
+    for status in ("en_attente", "en_cours", "termine", "ignore", "echec"):
+        print(f"   {status:<12}{counts.get(status, 0):>8}")
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Worker de génération de conseils alimenté par une file de jobs.")
+    parser.add_argument("--queue", choices=["sqlite", "supabase"], default="sqlite", help="File locale ou table file_generation")
+    parser.add_argument("--queue-path", default=DEFAULT_QUEUE_PATH, help="Fichier de la file SQLite")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Ajoute des jobs à la file")
+    enqueue.add_argument("user_ids", nargs="*", help="UUID d'utilisateurs")
+    target = enqueue.add_mutually_exclusive_group()
+    target.add_argument("--all-users", action="store_true", help="Toute la table profil_utilisateur")
+    target.add_argument("--users-file", help="Fichier contenant un UUID par ligne")
+    enqueue.add_argument("--kind", choices=sorted(JOB_HANDLERS), default=DEFAULT_JOB_KIND)
+
+    commands.add_parser("status", help="Nombre de jobs par statut")
+
+    run = commands.add_parser("run", help="Consomme la file jusqu'à SIGTERM/SIGINT")
+    run.add_argument("--concurrency", type=int, default=8, help="Jobs traités en parallèle")
+    run.add_argument("--poll-seconds", type=float, default=POLL_SECONDS, help="Attente quand la file est vide")
+    run.add_argument("--lease-seconds", type=int, default=LEASE_SECONDS, help="Durée de réservation d'un job")
+    run.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS, help="Essais avant statut 'echec'")
+    run.add_argument("--grace-seconds", type=float, default=SHUTDOWN_GRACE_SECONDS, help="Attente des jobs en cours à l'arrêt")
+    run.add_argument("--once", action="store_true", help="S'arrête quand la file est vide")
+    run.add_argument("--no-warm-up", dest="warm_up", action="store_false", help="Ne pas ouvrir les connexions au démarrage")
+    run.add_argument("--openai-rpm", type=int, help="Limite de requêtes/minute vers OpenAI")
+    run.add_argument("--supabase-rpm", type=int, help="Limite de requêtes/minute vers Supabase")
+    run.add_argument("--reuse-days", type=int, default=weekly.ADVICE_REUSE_DAYS,
+                     help="Réutilise un conseil de moins de N jours si les entrées sont identiques (0 = jamais)")
+    run.add_argument("--stream", action="store_true", default=weekly.STREAM_COMPLETIONS,
+                     help="Streame les complétions GPT-4o (sauvegarde progressive)")
+    run.add_argument("--rag-backend", choices=["rpc", "local"], default=weekly.RAG_BACKEND,
+                     help="Recherche via l'RPC match_nutrition_multi ou via l'index NumPy local")
+    add_profile_arguments(run)
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    if args.command == "run" or args.queue == "supabase" or getattr(args, "all_users", False):
+        try:
+            load_config()
+        except ConfigurationError as e:
+            print(f"❌ {e}")
+            exit(1)
+    queue = open_queue(args.queue, args.queue_path)
+
+    if args.command == "enqueue":
+        user_ids = args.user_ids
+        if args.all_users:
+            user_ids = weekly.fetch_all_user_ids()
+        elif args.users_file:
+            user_ids = weekly.read_users_file(args.users_file)
+        added = queue.enqueue(user_ids, args.kind)
+        print(f"📥 {added} jobs ajoutés ({len(user_ids) - added} déjà en file).")
+    elif args.command == "status":
+        print_counts(queue)
+    else:
+        weekly.RAG_BACKEND = args.rag_backend
+        weekly.ADVICE_REUSE_DAYS = args.reuse_days
+        weekly.STREAM_COMPLETIONS = args.stream
+        configure_rate_limits(openai_rpm=args.openai_rpm, supabase_rpm=args.supabase_rpm)
+        configure_context_pool(args.concurrency)
+        start_profiling(args)
+        if args.warm_up:
+            timings = warm_up()
+            print("🔥 Connexions ouvertes : " + ", ".join(f"{name} {t * 1000:.0f} ms" for name, t in timings.items()))
+        stop_event = threading.Event()
+        install_signal_handlers(stop_event)
+        print(f"--- Worker démarré (file {args.queue}, concurrence {args.concurrency}) ---")
+        stats = run_worker(queue, concurrency=args.concurrency, poll_seconds=args.poll_seconds,
+                           lease_seconds=args.lease_seconds, max_attempts=args.max_attempts,
+                           stop_event=stop_event, once=args.once, grace_seconds=args.grace_seconds)
+        print(f"\n--- BILAN DU WORKER ---\n✅ {stats['termine']} terminés, ⏭️  {stats['ignore']} ignorés, "
+              f"🔁 {stats['nouvelle_tentative']} à retenter, ❌ {stats['echec']} abandonnés")
+        print(get_default_cache().summary())
+        finish_profiling(args)
+        if stats["abandonnes"]:
+            os._exit(1)  # Ne pas attendre les threads encore bloqués sur un appel réseau
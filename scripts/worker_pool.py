@@ -0,0 +1,133 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from instrumentation import record_retry
+
+# --- LIMITES DE DÉBIT PAR FOURNISSEUR ---
+
+class RateLimiter:
+    """Seau à jetons partagé entre threads (requêtes par minute, None = illimité)."""
+
+    def __init__(self, per_minute=None):
+        self.per_minute = per_minute
+        self._lock = threading.Lock()
+        self._tokens = float(per_minute or 0)
+        self._last = time.monotonic()
+
+    def acquire(self):
+        if not self.per_minute:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                refill = (now - self._last) * self.per_minute / 60.0
+                self._tokens = min(float(self.per_minute), self._tokens + refill)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) * 60.0 / self.per_minute
+            time.sleep(wait)
+
+RATE_LIMITERS = {
+    "openai": RateLimiter(),
+    "supabase": RateLimiter(),
+}
+
+def configure_rate_limits(openai_rpm=None, supabase_rpm=None):
+    """Fixe les limites (requêtes/minute) appliquées à chaque fournisseur."""
+    RATE_LIMITERS["openai"] = RateLimiter(openai_rpm)
+    RATE_LIMITERS["supabase"] = RateLimiter(supabase_rpm)
+
+def throttle(provider):
+    """Bloque jusqu'à ce qu'un appel vers `provider` soit autorisé."""
+    RATE_LIMITERS[provider].acquire()
+
+# --- POINT DE REPRISE ---
+
+def load_checkpoint(path):
+    """Retourne les utilisateurs déjà traités (succès ou ignorés) d'un run précédent."""
+    done = set()
+    if not path or not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Ligne tronquée par un crash
+            if entry.get("status") in ("ok", "ignoré"):
+                done.add(entry["user_id"])
+    return done
+
+# --- POOL DE TRAVAIL ---
+
+async def run_for_users(user_ids, task, concurrency=8, checkpoint_path=None, resume=False, max_retries=1):
+    """Exécute `task(user_id)` pour chaque utilisateur avec au plus `concurrency` tâches en parallèle.
+
+    Chaque résultat est journalisé dans `checkpoint_path` (JSON lines) ; avec `resume`,
+    les utilisateurs déjà traités lors d'un run interrompu sont sautés.
+    """
+    done = load_checkpoint(checkpoint_path) if resume else set()
+    pending = [u for u in dict.fromkeys(user_ids) if u not in done]
+    summary = {"ok": [], "ignoré": [], "erreur": {}, "repris": len(done)}
+
+    checkpoint = None
+    if checkpoint_path:
+        os.makedirs(os.path.dirname(checkpoint_path) or ".", exist_ok=True)
+        checkpoint = open(checkpoint_path, "a" if resume else "w", encoding="utf-8")
+    write_lock = threading.Lock()
+
+    def record(user_id, status, error=None):
+        entry = {"user_id": user_id, "status": status, "at": datetime.now().isoformat(timespec="seconds")}
+        if error:
+            entry["error"] = error
+        if checkpoint:
+            with write_lock:
+                checkpoint.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                checkpoint.flush()
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        async def run_one(user_id):
+            async with semaphore:
+                error = None
+                for attempt in range(max_retries + 1):
+                    if attempt:
+                        record_retry("utilisateur")
+                    try:
+                        result = await loop.run_in_executor(executor, task, user_id)
+                        status = "ok" if result else "ignoré"  # None : rien à faire ; un échec lève une exception
+                        break
+                    except Exception as e:
+                        status, error = "erreur", str(e)
+                if status == "erreur":
+                    summary["erreur"][user_id] = error
+                else:
+                    summary[status].append(user_id)
+                record(user_id, status, error)
+
+        try:
+            await asyncio.gather(*(run_one(u) for u in pending))
+        finally:
+            if checkpoint:
+                checkpoint.close()
+
+    return summary
+
+def print_summary(summary):
+    """Affiche le bilan d'un run multi-utilisateurs."""
+    print("\n--- BILAN DU RUN ---")
+    if summary["repris"]:
+        print(f"↩️  {summary['repris']} utilisateurs déjà traités (reprise)")
+    print(f"✅ {len(summary['ok'])} conseils générés")
+    print(f"⏭️  {len(summary['ignoré'])} utilisateurs ignorés (conseil existant ou profil absent)")
+    print(f"❌ {len(summary['erreur'])} échecs")
+    for user_id, error in summary["erreur"].items():
+        print(f"   - {user_id} : {error}")
@@ -1,4 +1,4 @@
-import React, { createContext, useContext, useState, ReactNode, useEffect } from 'react';
+import React, { createContext, useContext, useState, ReactNode, useEffect, useRef } from 'react';
 import {
   UserProfile,
   TrainingSession,
@@ -36,6 +36,9 @@ interface AppContextType {
 
 const AppContext = createContext<AppContextType | undefined>(undefined);
 
+const ADVICE_STREAM_STALE_MS = 5 * 60 * 1000; // Au-delà, une ligne 'en_cours' est une génération interrompue
+const ADVICE_POLL_MS = 3000;
+
 export function AppProvider({ children }: { children: ReactNode }) {
   const [isLoggedIn, setIsLoggedIn] = useState(false);
   const [userProfile, setUserProfileState] = useState<UserProfile | null>(null);
@@ -44,6 +47,7 @@ export function AppProvider({ children }: { children: ReactNode }) {
   const [dailyNutrition, setDailyNutrition] = useState<DailyNutrition | null>(null);
   const [weeklyAdvice, setWeeklyAdvice] = useState<string | null>(null);
   const [dailyAdvice, setDailyAdvice] = useState<string | null>(null);
+  const weeklyPollRef = useRef<ReturnType<typeof setTimeout> | null>(null);
 
   const [isDarkMode, setIsDarkMode] = useState(() => {
     const saved = localStorage.getItem('darkMode');
@@ -80,12 +84,13 @@ export function AppProvider({ children }: { children: ReactNode }) {
         setUserProfileState(null);
         setSessions([]);
         setCompetitions([]);
+        stopWeeklyPoll();
         setWeeklyAdvice(null);
         setDailyAdvice(null);
       }
     });
 
-    return () => subscription.unsubscribe();
+    return () => { subscription.unsubscribe(); stopWeeklyPoll(); };
   }, []);
 
   const loadUserData = async (userId: string) => {
@@ -161,17 +166,12 @@ export function AppProvider({ children }: { children: ReactNode }) {
       })));
     }
 
-    // 4. Conseils Hebdo/Journalier (inchangé)
+    // 4. Conseils Hebdo/Journalier
     const today = new Date().toISOString().split('T')[0];
     const sessionAuth = await supabase.auth.getSession();
     const token = sessionAuth.data.session?.access_token;
     
-    const { data: adviceData } = await supabase.from('conseil_semaine').select('conseil').eq('id_utilisateur', userId).gte('date_creation', `${today}T00:00:00`).order('date_creation', { ascending: false }).limit(1).maybeSingle();
-    if (adviceData) setWeeklyAdvice(adviceData.conseil);
-    else supabase.functions.invoke('generate-weekly-advice', { 
-      body: { user_id: userId }, 
-      headers: { Authorization: `Bearer ${token}` } 
-    }).then(({ data }) => { if (data?.advice) setWeeklyAdvice(data.advice); });
+    loadWeeklyAdvice(userId, token);
 
     const { data: dailyAdviceData } = await supabase.from('conseil_jour').select('conseil').eq('id_utilisateur', userId).gte('date_creation', `${today}T00:00:00`).order('date_creation', { ascending: false }).limit(1).maybeSingle();
     if (dailyAdviceData) setDailyAdvice(dailyAdviceData.conseil);
@@ -181,6 +181,35 @@ export function AppProvider({ children }: { children: ReactNode }) {
     }).then(({ data }) => { if (data?.advice) setDailyAdvice(data.advice); });
   };
 
+  // Conseil 'termine' affiché tel quel ; une ligne 'en_cours' récente est une génération streamée
+  // (scripts/generate_weekly_strategy.py --stream) : son texte partiel est affiché et relu jusqu'à la fin
+  const loadWeeklyAdvice = async (userId: string, token?: string) => {
+    stopWeeklyPoll();
+    const today = new Date().toISOString().split('T')[0];
+    const { data: adviceRows } = await supabase.from('conseil_semaine').select('conseil, statut, date_creation').eq('id_utilisateur', userId).gte('date_creation', `${today}T00:00:00`).order('date_creation', { ascending: false });
+    const finished = adviceRows?.find((a: any) => a.statut !== 'en_cours');
+    const partial = adviceRows?.find((a: any) => a.statut === 'en_cours');
+    if (finished) {
+      setWeeklyAdvice(finished.conseil);
+      return;
+    }
+    if (partial && Date.now() - new Date(partial.date_creation).getTime() < ADVICE_STREAM_STALE_MS) {
+      if (partial.conseil) setWeeklyAdvice(partial.conseil);
+      weeklyPollRef.current = setTimeout(() => loadWeeklyAdvice(userId, token), ADVICE_POLL_MS);
+      return;
+    }
+    // Aucun conseil, ou génération interrompue (finalisée par la fonction edge)
+    supabase.functions.invoke('generate-weekly-advice', { 
+      body: { user_id: userId }, 
+      headers: { Authorization: `Bearer ${token}` } 
+    }).then(({ data }) => { if (data?.advice) setWeeklyAdvice(data.advice); });
+  };
+
+  const stopWeeklyPoll = () => {
+    if (weeklyPollRef.current) clearTimeout(weeklyPollRef.current);
+    weeklyPollRef.current = null;
+  };
+
   const parseJsonSafe = (input: string | any[] | null) => {
     if (!input) return [];
     if (Array.isArray(input)) return input;
@@ -0,0 +1,42 @@
+-- Réserve au plus p_limit jobs de file_generation pour un worker (scripts/worker.py).
+-- FOR UPDATE SKIP LOCKED : deux workers concurrents ne réservent jamais le même job.
+-- p_max_attempts : un job dont le bail a expiré après son dernier essai (worker tué ou bloqué)
+-- passe en 'echec' au lieu d'être repris indéfiniment (NULL = pas de limite).
+drop function if exists claim_generation_jobs (int, int);
+
+create or replace function claim_generation_jobs (
+  p_limit int,
+  p_lease_seconds int,
+  p_max_attempts int default null
+)
+returns setof file_generation
+language plpgsql
+as $$
+begin
+  update file_generation
+  set statut = 'echec',
+      bail_jusqua = null,
+      erreur = 'Bail expiré après le dernier essai (worker tué ou bloqué)',
+      date_maj = now()
+  where file_generation.statut = 'en_cours'
+    and file_generation.bail_jusqua < now()
+    and file_generation.tentatives >= p_max_attempts;
+
+  return query
+  update file_generation
+  set statut = 'en_cours',
+      tentatives = file_generation.tentatives + 1,
+      bail_jusqua = now() + make_interval(secs => p_lease_seconds),
+      date_maj = now()
+  where file_generation.id in (
+    select candidate.id
+    from file_generation candidate
+    where (candidate.statut = 'en_attente' and candidate.disponible_a <= now())
+       or (candidate.statut = 'en_cours' and candidate.bail_jusqua < now())
+    order by candidate.disponible_a, candidate.id
+    limit p_limit
+    for update skip locked
+  )
+  returning file_generation.*;
+end;
+$$;
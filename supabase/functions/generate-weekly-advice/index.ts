@@ -15,6 +15,9 @@ interface Seance {
   intensité: number; 
 }
 
+// Au-delà, une ligne 'en_cours' n'est plus alimentée : génération streamée interrompue
+const STREAM_STALE_MS = 5 * 60 * 1000
+
 const corsHeaders = {
     'Access-Control-Allow-Origin': '*',
     'Access-Control-Allow-Headers': 'authorization, x-client-info, apikey, content-type',
@@ -49,11 +52,19 @@ Deno.serve(async (req) => {
 
         const { data: existingAdvice } = await supabase
             .from('conseil_semaine')
-            .select('id')
+            .select('id, statut, date_creation')
             .eq('id_utilisateur', userId)
             .gte('date_creation', `${todayStr}T00:00:00`)
             .lt('date_creation', `${tomorrowStr}T00:00:00`)
-        
+
+        // Une ligne 'en_cours' est une génération streamée (scripts/generate_weekly_strategy.py --stream) :
+        // récente, elle est encore en cours et l'app affiche son texte partiel ; ancienne, elle a été interrompue
+        const isStreaming = (a: { statut: string; date_creation: string }) =>
+            a.statut === 'en_cours' && now.getTime() - new Date(a.date_creation).getTime() < STREAM_STALE_MS
+        const finishedAdvice = (existingAdvice || []).filter(a => a.statut !== 'en_cours')
+        const streamingAdvice = (existingAdvice || []).filter(isStreaming)
+        let interruptedId: number | null = null
+
         if (existingAdvice && existingAdvice.length > 0) {
             if (force_update) {
                 console.log(`Force update requested. Deleting ${existingAdvice.length} existing advice(s) for user ${userId} on ${todayStr}.`)
@@ -62,9 +73,14 @@ Deno.serve(async (req) => {
                     .from('conseil_semaine')
                     .delete()
                     .in('id', idsToDelete)
-            } else {
-                console.log(`generate-weekly-advice: Existing advice found for user ${userId} on ${todayStr}. Count=${existingAdvice.length}. force_update=${force_update}`)
+            } else if (finishedAdvice.length > 0) {
+                console.log(`generate-weekly-advice: Existing advice found for user ${userId} on ${todayStr}. Count=${finishedAdvice.length}. force_update=${force_update}`)
                 return new Response(JSON.stringify({ message: 'Advice already exists for today' }), { headers: corsHeaders })
+            } else if (streamingAdvice.length > 0) {
+                console.log(`generate-weekly-advice: Advice for user ${userId} is being streamed, not generating a second one.`)
+                return new Response(JSON.stringify({ message: 'Advice generation in progress' }), { headers: corsHeaders })
+            } else {
+                interruptedId = existingAdvice[0].id // Génération interrompue : finalisée ici plutôt que doublée
             }
         }
 
@@ -160,10 +176,14 @@ Deno.serve(async (req) => {
         }
 
         // 6. SAUVEGARDE (Correction : nom de colonne 'conseil' selon votre SQL)
-        await supabase.from('conseil_semaine').insert({
-            id_utilisateur: userId,
-            conseil: advice
-        })
+        if (interruptedId !== null) {
+            await supabase.from('conseil_semaine').update({ conseil: advice, statut: 'termine' }).eq('id', interruptedId)
+        } else {
+            await supabase.from('conseil_semaine').insert({
+                id_utilisateur: userId,
+                conseil: advice
+            })
+        }
 
         return new Response(JSON.stringify({ advice }), {
             headers: { ...corsHeaders, 'Content-Type': 'application/json' },
@@ -0,0 +1,85 @@
+-- Variante multi-requêtes de match_nutrition : un seul aller-retour pour toutes les
+-- requêtes thématiques d'un utilisateur (scripts/rag_retrieval.py).
+-- queries : [{"embedding": [...], "horizon": "week" | null}, ...]
+-- Retourne au plus match_count lignes par requête, avec son indice (à partir de 0).
+-- include_redundancy : renvoie aussi, pour chaque fiche, sa similarité avec les autres fiches
+-- retenues ({"id": similarité}) : le classement MMR côté client n'a pas besoin des vecteurs.
+drop function if exists match_nutrition_multi (jsonb, float, int, text, boolean);
+
+create or replace function match_nutrition_multi (
+  queries jsonb,
+  match_threshold float,
+  match_count int,
+  filter_profil text,
+  include_redundancy boolean default false
+)
+returns table (
+  query_index int,
+  id bigint,
+  content text,
+  similarity float,
+  metadata jsonb,
+  redundancy jsonb
+)
+language sql stable
+as $$
+  with q as (
+    select
+      (ordinality - 1)::int as query_index,
+      (value->>'embedding')::vector(1536) as query_embedding,
+      value->>'horizon' as filter_horizon
+    from jsonb_array_elements(queries) with ordinality
+  ),
+  m as (
+    select
+      q.query_index,
+      n.id,
+      n.content,
+      n.similarity,
+      n.metadata,
+      n.embedding
+    from q
+    cross join lateral (
+      select
+        nutrition.id,
+        nutrition.content,
+        1 - (nutrition.embedding <=> q.query_embedding) as similarity,
+        nutrition.metadata,
+        nutrition.embedding
+      from nutrition
+      where 1 - (nutrition.embedding <=> q.query_embedding) > match_threshold
+      and (
+          nutrition.metadata->>'profil' = 'tous'
+          or nutrition.metadata->>'profil' = filter_profil
+      )
+      and (
+          nutrition.metadata->>'horizon' = q.filter_horizon
+          or q.filter_horizon is null
+      )
+      order by nutrition.embedding <=> q.query_embedding
+      limit match_count
+    ) n
+  ),
+  candidates as (
+    select distinct on (m.id) m.id, m.embedding from m
+  ),
+  pairs as (
+    select
+      a.id,
+      jsonb_object_agg(b.id::text, round((1 - (a.embedding <=> b.embedding))::numeric, 4)) as redundancy
+    from candidates a
+    join candidates b on b.id <> a.id
+    where include_redundancy
+    group by a.id
+  )
+  select
+    m.query_index,
+    m.id,
+    m.content,
+    m.similarity,
+    m.metadata,
+    case when include_redundancy then coalesce(pairs.redundancy, '{}'::jsonb) end
+  from m
+  left join pairs on pairs.id = m.id
+  order by m.query_index, m.similarity desc;
+$$;